@@ -0,0 +1,85 @@
+import numpy as np
+
+
+def _assign(points, centroids, chunk_size=65536):
+    centroid_sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignment = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), chunk_size):
+        block = np.asarray(points[start:start+chunk_size], dtype=np.float32)
+        scores = block @ centroids.T
+        scores *= -2.0
+        scores += centroid_sq_norms
+        assignment[start:start+chunk_size] = np.argmin(scores, axis=1)
+    return assignment
+
+
+def kmeans(points, n_clusters, iterations=20, sample_size=None, seed=0):
+    rng = np.random.default_rng(seed)
+    if sample_size is not None and len(points) > sample_size:
+        train = np.asarray(points[np.sort(rng.choice(len(points), sample_size, replace=False))], dtype=np.float32)
+    else:
+        train = np.asarray(points, dtype=np.float32)
+    centroids = train[rng.choice(len(train), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(train, centroids)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=n_clusters)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+        sums = np.add.reduceat(train[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums / counts[non_empty, None]
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_ids):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+
+    def __len__(self):
+        return len(self.list_ids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @staticmethod
+    def list_count(size, n_lists=None):
+        if n_lists is None:
+            n_lists = int(round(4 * np.sqrt(size)))
+        return max(1, min(n_lists, size))
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, iterations=10, seed=0):
+        n_lists = cls.list_count(len(embeddings), n_lists)
+        centroids = kmeans(embeddings, n_lists, iterations, sample_size=max(32 * n_lists, 20000), seed=seed)
+        assignment = _assign(embeddings, centroids)
+        list_ids = np.argsort(assignment, kind='stable').astype(np.int64)
+        list_offsets = np.searchsorted(assignment[list_ids], np.arange(n_lists + 1))
+        return cls(centroids, list_offsets, list_ids)
+
+    def candidates(self, probe, n_probe):
+        if n_probe >= self.n_lists:
+            return np.arange(len(self.list_ids))
+        scores = self.centroid_sq_norms - 2.0 * (self.centroids @ probe)
+        nearest_lists = np.argpartition(scores, n_probe - 1)[:n_probe]
+        return np.concatenate([
+            self.list_ids[self.list_offsets[l]:self.list_offsets[l+1]] for l in nearest_lists
+        ])
+
+    def save(self, file):
+        np.savez(file, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids,
+                 n_lists=self.n_lists)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(data['centroids'], data['list_offsets'], data['list_ids'])
+            if int(data['n_lists']) != index.n_lists or len(index.list_offsets) != index.n_lists + 1:
+                raise ValueError(f"{path} has inconsistent IVF lists")
+            return index
@@ -0,0 +1,49 @@
+import hashlib
+import cv2
+import numpy as np
+from config import AUGMENTATIONS
+
+FACE_SIZE = 160
+BRIGHTNESS = {
+    'bright': (1.2, 20),
+    'dark': (0.8, -20),
+}
+ROTATIONS = {
+    'rotate_plus': 5,
+    'rotate_minus': -5,
+}
+DESCRIPTIONS = {
+    'original': "Original",
+    'flip': "Horizontal flip",
+    'bright': "Brightened",
+    'dark': "Darkened",
+    'rotate_plus': "Rotated +5°",
+    'rotate_minus': "Rotated -5°",
+}
+_CENTER = (FACE_SIZE // 2, FACE_SIZE // 2)
+_ROTATION_MATRICES = {name: cv2.getRotationMatrix2D(_CENTER, angle, 1.0) for name, angle in ROTATIONS.items()}
+# convertScaleAbs(x, alpha, beta) == saturate(round(|alpha * x + beta|)) for every uint8 value
+_BRIGHTNESS_LUTS = {name: np.clip(np.rint(np.abs(np.arange(256, dtype=np.float64) * alpha + beta)), 0, 255).astype(np.uint8)
+                    for name, (alpha, beta) in BRIGHTNESS.items()}
+
+
+def augmentation_key(augmentations=AUGMENTATIONS):
+    return hashlib.sha1(",".join(augmentations).encode('utf-8')).hexdigest()[:8]
+
+
+def augment_batch(face, augmentations=AUGMENTATIONS, out=None):
+    if out is None:
+        out = np.empty((len(augmentations), FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+    crop = cv2.resize(face, (FACE_SIZE, FACE_SIZE))
+    for i, name in enumerate(augmentations):
+        if name == 'original':
+            out[i] = crop
+        elif name == 'flip':
+            out[i] = crop[:, ::-1]
+        elif name in _ROTATION_MATRICES:
+            cv2.warpAffine(crop, _ROTATION_MATRICES[name], (FACE_SIZE, FACE_SIZE), dst=out[i])
+        elif name in BRIGHTNESS:
+            cv2.LUT(crop, _BRIGHTNESS_LUTS[name], dst=out[i])
+        else:
+            raise ValueError(f"Unknown augmentation '{name}'")
+    return out
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex
+from face_utils import Gallery, find_best_matches
+
+
+def face_subspace(dim, intrinsic_dim=32, seed=0):
+    # Real face embeddings vary along far fewer directions than they have dimensions, so people
+    # crowd together. Drawing identities from a shared low-dimensional subspace reproduces that;
+    # isotropic random centers are nearly orthogonal and make every probe count look exact.
+    rng = np.random.default_rng(seed)
+    intrinsic_dim = min(intrinsic_dim, dim)
+    return np.linalg.qr(rng.standard_normal((dim, intrinsic_dim)))[0].T.astype(np.float32)
+
+
+def identity_centers(n_identities, basis, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_identities, len(basis)), dtype=np.float32) @ basis
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    return centers
+
+
+def synthetic_gallery(size, dim, per_identity=6, noise=1.2, intrinsic_dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    n_identities = max(1, size // per_identity)
+    centers = identity_centers(n_identities, face_subspace(dim, intrinsic_dim), seed)
+    labels = np.arange(size) % n_identities
+    gallery = np.empty((size, dim), dtype=np.float32)
+    chunk_size = 100000
+    for start in range(0, size, chunk_size):
+        block = centers[labels[start:start+chunk_size]]
+        block += rng.standard_normal(block.shape, dtype=np.float32) * (noise / np.sqrt(dim))
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        gallery[start:start+chunk_size] = block
+    return gallery
+
+
+def synthetic_queries(gallery, n_queries, noise=1.2, seed=1):
+    rng = np.random.default_rng(seed)
+    dim = gallery.shape[1]
+    queries = gallery[rng.choice(len(gallery), n_queries, replace=False)].copy()
+    queries += rng.standard_normal(queries.shape, dtype=np.float32) * (noise / np.sqrt(dim))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def synthetic_strangers(n_queries, dim, intrinsic_dim=32, seed=2):
+    # Faces of people who are not enrolled: same subspace, new identities.
+    return identity_centers(n_queries, face_subspace(dim, intrinsic_dim), seed + 1000)
+
+
+def gallery_from(embeddings, per_identity=6):
+    # synthetic_gallery interleaves identities; a Gallery needs each identity's rows together.
+    n_identities = max(1, len(embeddings) // per_identity)
+    labels = np.arange(len(embeddings)) % n_identities
+    order = np.argsort(labels, kind='stable')
+    identities = [[f"person{i}", f"Person {i}", "N/A"] for i in range(n_identities)]
+    return Gallery(embeddings[order], labels[order].astype(np.int32), identities)
+
+
+def time_single_queries(search, queries):
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def recall_at_1(found, truth):
+    return float(np.mean([a == b for a, b in zip(found, truth)]))
+
+
+def run(size, dim, n_queries, probes, n_lists, noise, intrinsic_dim):
+    print(f"\nGallery size: {size:,} x {dim} (identities in a {min(intrinsic_dim, dim)}-dim subspace, noise {noise:g})")
+    embeddings = synthetic_gallery(size, dim, noise=noise, intrinsic_dim=intrinsic_dim)
+    known = synthetic_queries(embeddings, n_queries, noise=noise)
+    strangers = synthetic_strangers(n_queries, dim, intrinsic_dim)
+    gallery = gallery_from(embeddings)
+    del embeddings
+
+    # Both searches go through find_best_matches, the path the recognizers use; recall@1 is the
+    # fraction of queries whose nearest identity matches the exact scan. Enrolled people and
+    # strangers are reported separately: a stranger's nearest identity is usually past
+    # RECOGNITION_THRESHOLD anyway, so its recall mostly affects the reported distance.
+    known_truth, _, _ = find_best_matches(known, gallery, np.inf)
+    stranger_truth, _, _ = find_best_matches(strangers, gallery, np.inf)
+    timed_queries = known[:min(len(known), 200)]
+    exact_qps = time_single_queries(lambda q: find_best_matches(q, gallery, np.inf), timed_queries)
+    print(f"  {'':14s} {'recall@1 known':>14s} {'strangers':>10s} {'queries/sec':>12s}")
+    print(f"  {'exact':14s} {1.0:14.3f} {1.0:10.3f} {exact_qps:12.1f}")
+
+    start = time.perf_counter()
+    gallery.index = IVFIndex.build(gallery.embeddings, n_lists)
+    print(f"  IVF build: {gallery.index.n_lists} lists in {time.perf_counter() - start:.1f}s")
+    for n_probe in probes:
+        if n_probe >= gallery.index.n_lists:
+            print(f"  ivf probes={n_probe:<4d} skipped: probes every list (exact search)")
+            continue
+        known_recall = recall_at_1(find_best_matches(known, gallery, np.inf, n_probe=n_probe)[0], known_truth)
+        stranger_recall = recall_at_1(find_best_matches(strangers, gallery, np.inf, n_probe=n_probe)[0], stranger_truth)
+        qps = time_single_queries(lambda q: find_best_matches(q, gallery, np.inf, n_probe=n_probe), timed_queries)
+        print(f"  ivf probes={n_probe:<4d} {known_recall:14.3f} {stranger_recall:10.3f} {qps:12.1f}  ({qps / exact_qps:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@1 and queries/sec of IVF matching against the exact scan")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--lists', type=int, default=None, help="IVF lists (default: 4*sqrt(size))")
+    parser.add_argument('--noise', type=float, default=1.2, help="Spread of each person's embeddings and queries")
+    parser.add_argument('--intrinsic-dim', type=int, default=32,
+                        help="Dimensions identities vary along (lower = people closer together, harder)")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.dim, args.queries, args.probes, args.lists, args.noise, args.intrinsic_dim)
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import AUGMENTATIONS
+from augmentation import augment_batch
+from train_faces_enhanced import augment_image
+
+
+def synthetic_faces(size, count, seed=0):
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), (0, 0), size / 50)
+    return [np.roll(base, i * 7, axis=1) for i in range(count)]
+
+
+def raw_crop_pipeline(face):
+    return np.stack([cv2.resize(variant, (160, 160)) for variant in augment_image(face)])
+
+
+def time_per_image(augment, faces, repeats):
+    augment(faces[0])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for face in faces:
+            augment(face)
+    return (time.perf_counter() - start) * 1000.0 / (repeats * len(faces))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time per image of raw-crop vs 160x160 batched augmentation")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[160, 400, 800, 1600], help="Face crop side in pixels")
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Augmentations: {', '.join(AUGMENTATIONS)}")
+    print(f"{'crop':>6s} {'raw crop ms':>12s} {'batched ms':>11s} {'speedup':>8s}")
+    for size in args.sizes:
+        faces = synthetic_faces(size, args.images)
+        before = time_per_image(raw_crop_pipeline, faces, args.repeats)
+        after = time_per_image(augment_batch, faces, args.repeats)
+        print(f"{size:6d} {before:12.3f} {after:11.3f} {before / after:7.1f}x")
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import MIN_FACE_SIZE
+from face_utils import detect_faces
+
+DETECTION_SCALES = [("1080p", 1920), ("720p", 1280), ("480p", 854)]
+
+
+def load_frame(image_path):
+    if image_path:
+        frame = cv2.imread(image_path)
+        if frame is None:
+            print(f"Error: Could not read image: {image_path}")
+            sys.exit(1)
+    else:
+        rng = np.random.default_rng(0)
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8), (0, 0), 3)
+    frame = cv2.resize(frame, (1920, 1080))
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MTCNN ms/frame on a 1080p frame at several detection scales")
+    parser.add_argument('--image', default=None, help="Image with faces (resized to 1920x1080); synthetic noise if omitted")
+    parser.add_argument('--frames', type=int, default=10)
+    parser.add_argument('--min-face-size', type=int, nargs='+', default=[20, MIN_FACE_SIZE])
+    args = parser.parse_args()
+    try:
+        from mtcnn import MTCNN
+        detector = MTCNN()
+    except Exception as e:
+        print(f"Error initializing MTCNN: {e}")
+        sys.exit(1)
+
+    frame = load_frame(args.image)
+    print(f"Frame: {frame.shape[1]}x{frame.shape[0]}, {args.frames} frames per setting")
+    print(f"{'detect at':>10s} {'min face':>9s} {'ms/frame':>9s} {'faces':>6s}")
+    for label, max_side in DETECTION_SCALES:
+        for min_face_size in args.min_face_size:
+            results = detect_faces(detector, frame, max_side, min_face_size)
+            start = time.perf_counter()
+            for _ in range(args.frames):
+                detect_faces(detector, frame, max_side, min_face_size)
+            ms = (time.perf_counter() - start) * 1000.0 / args.frames
+            print(f"{label:>10s} {min_face_size:9d} {ms:9.1f} {len(results):6d}")
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hud_overlay import HudRenderer
+
+STATUS_TEXT = "Gallery v1 (12 people)"
+GPS_TEXT = "GPS: 18.520430, 73.856743"
+INFO_LINES = ("Display 24.0 FPS | Latency 120 ms | Inference 85 ms",
+              "Detect every 3 frame(s) | detect 60 ms, embed 25 ms, render 4 ms")
+RESOLUTIONS = {'1080p': (1920, 1080), '720p': (1280, 720), '480p': (640, 480)}
+
+
+def full_frame_overlay(frame, clock_text):
+    """The per-frame HUD drawing live_recognition.py used before hud_overlay.HudRenderer."""
+    frame_height, frame_width = frame.shape[:2]
+    top_overlay = frame.copy()
+    cv2.rectangle(top_overlay, (0, 0), (frame_width, 40), (15, 15, 15), -1)
+    cv2.addWeighted(top_overlay, 0.7, frame, 0.3, 0, frame)
+    cv2.line(frame, (0, 39), (frame_width, 39), (0, 255, 200), 2)
+    cv2.circle(frame, (15, 20), 6, (0, 255, 200), -1)
+    cv2.putText(frame, "LIVE", (28, 27), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 255, 200), 1, cv2.LINE_AA)
+    cv2.putText(frame, STATUS_TEXT, (80, 27), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (200, 200, 200), 1, cv2.LINE_AA)
+    for i, line in enumerate(INFO_LINES):
+        cv2.putText(frame, line, (10, 40 + 20 * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 200), 1, cv2.LINE_AA)
+    text_size = cv2.getTextSize("Press 'S' to Capture", cv2.FONT_HERSHEY_SIMPLEX, 0.45, 1)[0]
+    cv2.putText(frame, "Press 'S' to Capture", (frame_width - text_size[0] - 15, 27), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (100, 200, 255), 1, cv2.LINE_AA)
+    panel_x, panel_y = frame_width - 330, frame_height - 85
+    bottom_overlay = frame.copy()
+    cv2.rectangle(bottom_overlay, (panel_x, panel_y), (frame_width - 10, frame_height - 10), (20, 20, 20), -1)
+    cv2.addWeighted(bottom_overlay, 0.75, frame, 0.25, 0, frame)
+    cv2.rectangle(frame, (panel_x, panel_y), (frame_width - 10, frame_height - 10), (0, 200, 255), 2)
+    cv2.line(frame, (panel_x, panel_y+30), (frame_width - 10, panel_y+30), (40, 40, 40), 1)
+    cv2.circle(frame, (panel_x + 15, panel_y + 15), 4, (100, 200, 255), -1)
+    cv2.putText(frame, "GPS", (panel_x + 25, panel_y + 20), cv2.FONT_HERSHEY_DUPLEX, 0.4, (100, 200, 255), 1, cv2.LINE_AA)
+    cv2.putText(frame, GPS_TEXT.replace("GPS: ", ""), (panel_x + 15, panel_y + 48), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1, cv2.LINE_AA)
+    cv2.circle(frame, (panel_x + 15, panel_y + 58), 4, (255, 150, 100), -1)
+    cv2.putText(frame, "TIME", (panel_x + 25, panel_y + 63), cv2.FONT_HERSHEY_DUPLEX, 0.4, (255, 150, 100), 1, cv2.LINE_AA)
+    cv2.putText(frame, clock_text, (panel_x + 70, panel_y + 63), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1, cv2.LINE_AA)
+
+
+def synthetic_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def time_per_frame(draw, frame, repeats):
+    canvas = frame.copy()
+    draw(canvas)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        np.copyto(canvas, frame)
+        draw(canvas)
+    return (time.perf_counter() - start) * 1000.0 / repeats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HUD render time per frame: full-frame blends vs cached ROI layers")
+    parser.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    # The copy that resets the canvas each repeat is timed for both, so the difference is the HUD alone.
+    print(f"{'frame':>6s} {'full-frame ms':>14s} {'cached ms':>10s} {'speedup':>8s} {'max pixel diff':>15s}")
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        frame = synthetic_frame(width, height)
+        hud = HudRenderer()
+        before = time_per_frame(lambda canvas: full_frame_overlay(canvas, hud.clock()), frame, args.repeats)
+        after = time_per_frame(lambda canvas: hud.render(canvas, STATUS_TEXT, GPS_TEXT, INFO_LINES), frame, args.repeats)
+        expected, actual = frame.copy(), frame.copy()
+        hud.render(actual, STATUS_TEXT, GPS_TEXT, INFO_LINES)
+        full_frame_overlay(expected, hud.clock_text)
+        diff = int(np.abs(expected.astype(np.int16) - actual).max())
+        print(f"{name:>6s} {before:14.3f} {after:10.3f} {before / after:7.1f}x {diff:15d}")
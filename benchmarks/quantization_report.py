@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import RECOGNITION_THRESHOLD
+from face_utils import Gallery, load_gallery, quantize_embeddings, find_best_matches
+
+
+def synthetic_gallery(n_identities, per_identity, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_identities, dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    embeddings = np.repeat(centers, per_identity, axis=0)
+    embeddings += rng.standard_normal(embeddings.shape, dtype=np.float32) * (0.5 / np.sqrt(dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    labels = np.repeat(np.arange(n_identities, dtype=np.int32), per_identity)
+    identities = [[f"person{i}", f"Person {i}", "N/A"] for i in range(n_identities)]
+    return Gallery(embeddings, labels, identities)
+
+
+def make_probes(gallery, n_probes, noise, seed=1):
+    rng = np.random.default_rng(seed)
+    probes = np.asarray(gallery.embeddings[rng.choice(len(gallery), n_probes)], dtype=np.float32)
+    probes += rng.standard_normal(probes.shape, dtype=np.float32) * (noise / np.sqrt(probes.shape[1]))
+    return probes
+
+
+def search_bytes(gallery):
+    total = gallery.search_embeddings.nbytes + gallery.search_sq_norms.nbytes
+    if gallery.search_scale is not None:
+        total += gallery.search_scale.nbytes
+    return total
+
+
+def run_variant(gallery, probes):
+    start = time.perf_counter()
+    folder_names, distances, _ = find_best_matches(probes, gallery, RECOGNITION_THRESHOLD)
+    return folder_names, distances, (time.perf_counter() - start) * 1000.0 / len(probes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and match-decision impact of quantized gallery storage")
+    parser.add_argument('--synthetic', type=int, default=None, metavar='N_IDENTITIES',
+                        help="Use a synthetic gallery instead of Trained_Model/")
+    parser.add_argument('--per-identity', type=int, default=12)
+    parser.add_argument('--probes', type=int, default=2000)
+    parser.add_argument('--noise', type=float, default=0.7, help="Probe perturbation (L2 norm)")
+    parser.add_argument('--rerank', type=int, nargs='+', default=[0, 20])
+    args = parser.parse_args()
+
+    if args.synthetic:
+        base = synthetic_gallery(args.synthetic, args.per_identity, 512)
+    else:
+        base = load_gallery()
+        if base is None:
+            sys.exit(1)
+        base = Gallery(np.asarray(base.embeddings), np.asarray(base.labels), base.identities)
+    probes = make_probes(base, args.probes, args.noise)
+    reference_names, reference_distances, reference_ms = run_variant(base, probes)
+    reference_bytes = search_bytes(base)
+
+    print(f"Gallery: {len(base)} embeddings x {base.embeddings.shape[1]}, {len(base.identities)} identities")
+    print(f"Probes: {len(probes)}, threshold {RECOGNITION_THRESHOLD}")
+    print(f"{'storage':10s} {'rerank':>6s} {'search MB':>10s} {'saved':>7s} {'ms/probe':>9s} "
+          f"{'changed':>8s} {'max |dd|':>9s}")
+    print(f"{'float32':10s} {'-':>6s} {reference_bytes / 2**20:10.2f} {'0.0%':>7s} {reference_ms:9.3f} "
+          f"{0:8d} {0.0:9.5f}")
+    for storage in ("float16", "int8"):
+        quantized = quantize_embeddings(np.asarray(base.embeddings), storage)
+        for rerank in args.rerank:
+            gallery = Gallery(base.embeddings, base.labels, base.identities, base.sq_norms,
+                              quantized=quantized, rerank=rerank)
+            folder_names, distances, ms = run_variant(gallery, probes)
+            changed = sum(a != b for a, b in zip(folder_names, reference_names))
+            saved = 1.0 - search_bytes(gallery) / reference_bytes
+            max_error = float(np.max(np.abs(distances - reference_distances)))
+            print(f"{storage:10s} {rerank:6d} {search_bytes(gallery) / 2**20:10.2f} {saved:7.1%} {ms:9.3f} "
+                  f"{changed:8d} {max_error:9.5f}")
+    print("\nRe-ranking reads at most `rerank` float32 rows per probe from the memory-mapped "
+          "embeddings.npy, so those pages stay mostly non-resident.")
@@ -0,0 +1,302 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import face_utils
+from ann_benchmark import synthetic_gallery, synthetic_queries
+from augmentation_benchmark import synthetic_faces
+from hud_benchmark import synthetic_frame, STATUS_TEXT, GPS_TEXT, INFO_LINES, RESOLUTIONS
+
+STAGES = ('gallery', 'matching', 'detection', 'embedding', 'augmentation', 'overlay')
+FACES_PER_FRAME = 4
+
+
+def machine_specs():
+    specs = {'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+             'cpu_count': os.cpu_count(), 'python': platform.python_version(), 'numpy': np.__version__,
+             'opencv': cv2.__version__, 'opencv_threads': cv2.getNumThreads()}
+    with contextlib.suppress(OSError):
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    specs['processor'] = line.split(':', 1)[1].strip()
+                    break
+    with contextlib.suppress(ValueError, OSError, AttributeError):
+        specs['memory_gb'] = round(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3, 1)
+    if 'tensorflow' in sys.modules:
+        specs['tensorflow'] = sys.modules['tensorflow'].__version__
+    with contextlib.suppress(OSError, subprocess.SubprocessError):
+        specs['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    return specs
+
+
+def measure(fn, repeats, units=1, setup=None, warmup=1):
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    ms = np.array(times) * 1000.0
+    result = {'median_ms': round(float(np.median(ms)), 4), 'p90_ms': round(float(np.percentile(ms, 90)), 4),
+              'min_ms': round(float(ms.min()), 4), 'repeats': repeats}
+    if units > 1:
+        result['units'] = units
+        result['units_per_sec'] = round(units * 1000.0 / result['median_ms'], 1) if result['median_ms'] > 0 else None
+    return result
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def trained_model_dir(path):
+    # face_utils resolves its gallery paths from config at import time; point them at a scratch
+    # directory so the benchmark never reads or rebuilds the real Trained_Model/ gallery.
+    names = ['TRAINED_MODEL_DIR', 'GALLERY_DIR'] + [n for n in dir(face_utils) if n.startswith('GALLERY_') and n.endswith('_FILE')]
+    saved = {name: getattr(face_utils, name) for name in names}
+    gallery_dir = os.path.join(path, os.path.basename(saved['GALLERY_DIR']))
+    face_utils.TRAINED_MODEL_DIR = path
+    face_utils.GALLERY_DIR = gallery_dir
+    for name in names[2:]:
+        setattr(face_utils, name, os.path.join(gallery_dir, os.path.basename(saved[name])))
+    try:
+        yield gallery_dir
+    finally:
+        for name, value in saved.items():
+            setattr(face_utils, name, value)
+
+
+def write_synthetic_encodings(path, size, dim, per_identity):
+    embeddings = synthetic_gallery(size, dim, per_identity)
+    n_identities = max(1, size // per_identity)
+    labels = np.arange(size) % n_identities
+    for identity in range(n_identities):
+        person_dir = os.path.join(path, f"person{identity:05d}")
+        os.makedirs(person_dir, exist_ok=True)
+        np.savez(os.path.join(person_dir, "encodings.npz"), embeddings=embeddings[labels == identity],
+                 folder_name=f"person{identity:05d}", name=f"Person {identity}", age="30")
+    return embeddings
+
+
+def check_ivf_after_build(gallery_dir):
+    # The first load after training rebuilds the gallery; with MATCH_INDEX = "ivf" it must come back indexed.
+    saved = face_utils.MATCH_INDEX, face_utils.IVF_MIN_GALLERY_SIZE
+    face_utils.MATCH_INDEX, face_utils.IVF_MIN_GALLERY_SIZE = "ivf", 0
+    try:
+        shutil.rmtree(gallery_dir, ignore_errors=True)
+        gallery = face_utils.load_gallery()
+    finally:
+        face_utils.MATCH_INDEX, face_utils.IVF_MIN_GALLERY_SIZE = saved
+    shutil.rmtree(gallery_dir, ignore_errors=True)
+    if gallery is None or gallery.index is None:
+        raise AssertionError("gallery loaded right after a rebuild has no IVF index")
+
+
+def bench_gallery_and_matching(results, args, stages):
+    for size in args.gallery_sizes:
+        work_dir = tempfile.mkdtemp(prefix="face_benchmark_")
+        try:
+            embeddings = write_synthetic_encodings(work_dir, size, args.dim, args.per_identity)
+            queries = synthetic_queries(embeddings, min(args.queries, size))
+            with trained_model_dir(work_dir) as gallery_dir, quiet():
+                if 'gallery' in stages:
+                    # Build: every encodings.npz is read and the gallery index written from scratch.
+                    results[f"load_embeddings/build/{size}"] = measure(
+                        face_utils.load_embeddings, max(3, args.repeats // 4),
+                        setup=lambda: shutil.rmtree(gallery_dir, ignore_errors=True))
+                    face_utils.load_embeddings()
+                    results[f"load_embeddings/cached/{size}"] = measure(face_utils.load_embeddings, args.repeats)
+                    check_ivf_after_build(gallery_dir)
+                if 'matching' in stages:
+                    gallery = face_utils.load_gallery()
+                    known_embeddings, folder_names = np.asarray(gallery.embeddings), gallery.folder_names
+                    results[f"find_best_match/{size}"] = measure(
+                        lambda: [face_utils.find_best_match(q, known_embeddings, folder_names) for q in queries],
+                        args.repeats, units=len(queries))
+                    frame_faces = queries[:FACES_PER_FRAME]
+                    results[f"find_best_matches/{size}x{FACES_PER_FRAME}"] = measure(
+                        lambda: face_utils.find_best_matches(frame_faces, gallery), args.repeats, units=len(frame_faces))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_detection(results, args):
+    from mtcnn import MTCNN
+    detector = MTCNN()
+    image = cv2.imread(args.image) if args.image else None
+    if args.image and image is None:
+        raise ValueError(f"could not read image: {args.image}")
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        frame = cv2.resize(image, (width, height)) if image is not None else synthetic_frame(width, height)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results[f"mtcnn/{name}"] = measure(lambda: face_utils.detect_faces(detector, rgb_frame),
+                                           max(3, args.repeats // 4))
+
+
+def bench_embedding(results, args, machine):
+    from compiled_embedder import load_embedder
+    with quiet():
+        embedder = load_embedder()
+    machine['tensorflow'] = sys.modules['tensorflow'].__version__
+    crops = np.stack(synthetic_faces(160, max(args.batch_sizes)))
+    for batch_size in args.batch_sizes:
+        batch = crops[:batch_size]
+        results[f"facenet/batch{batch_size}"] = measure(lambda: embedder.embeddings(batch),
+                                                        max(3, args.repeats // 2), units=batch_size)
+
+
+def bench_augmentation(results, args):
+    from augmentation import augment_batch
+    from train_faces_enhanced import augment_image
+    for size in args.crop_sizes:
+        face = synthetic_faces(size, 1)[0]
+        results[f"augment_image/{size}"] = measure(lambda: augment_image(face), args.repeats)
+        results[f"augment_batch/{size}"] = measure(lambda: augment_batch(face), args.repeats)
+
+
+def bench_overlay(results, args):
+    from hud_overlay import HudRenderer
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        frame = synthetic_frame(width, height)
+        canvas = frame.copy()
+        hud = HudRenderer()
+        hud.render(canvas, STATUS_TEXT, GPS_TEXT, INFO_LINES)
+        # Only the render is timed; the canvas is reset outside the timed call.
+        results[f"hud_overlay/{name}"] = measure(lambda: hud.render(canvas, STATUS_TEXT, GPS_TEXT, INFO_LINES),
+                                                 args.repeats * 5, setup=lambda: np.copyto(canvas, frame))
+
+
+def run_suite(args):
+    stages = args.stages
+    machine = machine_specs()
+    results = {}
+    skipped = {}
+    runs = [('gallery', lambda: bench_gallery_and_matching(results, args, stages)),
+            ('detection', lambda: bench_detection(results, args)),
+            ('embedding', lambda: bench_embedding(results, args, machine)),
+            ('augmentation', lambda: bench_augmentation(results, args)),
+            ('overlay', lambda: bench_overlay(results, args))]
+    for stage, run in runs:
+        if stage not in stages and not (stage == 'gallery' and 'matching' in stages):
+            continue
+        print(f"Running {stage if stage != 'gallery' else 'gallery/matching'} benchmarks...")
+        start = time.perf_counter()
+        try:
+            run()
+        except AssertionError:
+            # A failed correctness check fails the run; only missing models are skipped.
+            raise
+        except Exception as e:
+            # Missing optional models (mtcnn, keras-facenet) skip their stage instead of failing the run.
+            skipped[stage] = f"{type(e).__name__}: {e}"
+            print(f"  skipped: {skipped[stage]}")
+            continue
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+    settings = {name: getattr(args, name) for name in ('stages', 'repeats', 'gallery_sizes', 'dim', 'per_identity',
+                                                       'queries', 'batch_sizes', 'crop_sizes', 'resolutions', 'image')}
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'machine': machine, 'settings': settings,
+            'results': results, 'skipped': skipped}
+
+
+def print_results(report):
+    print(f"\n{'benchmark':<32s} {'median ms':>11s} {'p90 ms':>10s} {'units/sec':>11s}")
+    for name, result in report['results'].items():
+        rate = f"{result['units_per_sec']:11.1f}" if result.get('units_per_sec') else f"{'':11s}"
+        print(f"{name:<32s} {result['median_ms']:11.3f} {result['p90_ms']:10.3f} {rate}")
+
+
+def compare(baseline, current, tolerance, min_delta_ms):
+    for key in ('processor', 'cpu_count', 'platform'):
+        if baseline['machine'].get(key) != current['machine'].get(key):
+            print(f"Warning: baseline was recorded on a different machine ({key}: "
+                  f"{baseline['machine'].get(key)} vs {current['machine'].get(key)})")
+    print(f"\n{'benchmark':<32s} {'baseline ms':>12s} {'current ms':>11s} {'change':>8s}  status")
+    regressions = []
+    for name in list(baseline['results']) + [n for n in current['results'] if n not in baseline['results']]:
+        before = baseline['results'].get(name)
+        after = current['results'].get(name)
+        if before is None or after is None:
+            status = "new" if before is None else "missing"
+            value = after or before
+            print(f"{name:<32s} {'':>12s} {'':>11s} {'':>8s}  {status} ({value['median_ms']:.3f} ms)")
+            continue
+        change = after['median_ms'] / before['median_ms'] - 1.0 if before['median_ms'] > 0 else 0.0
+        delta = after['median_ms'] - before['median_ms']
+        # Sub-min_delta_ms differences are timer noise even when they are large in relative terms.
+        if change > tolerance and delta > min_delta_ms:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -tolerance and -delta > min_delta_ms:
+            status = "faster"
+        else:
+            status = "ok"
+        print(f"{name:<32s} {before['median_ms']:12.3f} {after['median_ms']:11.3f} {change * 100:+7.1f}%  {status}")
+    print(f"\n{len(regressions)} regressions (tolerance {tolerance * 100:.0f}%, at least {min_delta_ms} ms)")
+    return regressions
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for every pipeline stage, saved as JSON and "
+                                                 "optionally compared against a baseline run")
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--output', default=None, help="Write results and machine specs to this JSON file")
+    parser.add_argument('--compare', default=None, metavar='BASELINE', help="Flag regressions against a saved run")
+    parser.add_argument('--current', default=None, help="With --compare: use this saved run instead of running the suite")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Relative slowdown counted as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--gallery-sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--per-identity', type=int, default=10, help="Synthetic embeddings per person")
+    parser.add_argument('--queries', type=int, default=100, help="Probes per find_best_match timing")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32], help="FaceNet batch sizes")
+    parser.add_argument('--crop-sizes', type=int, nargs='+', default=[160, 400], help="Face crop side for augmentation")
+    parser.add_argument('--resolutions', nargs='+', default=['1080p', '720p'], choices=list(RESOLUTIONS))
+    parser.add_argument('--image', default=None, help="Photo with faces for MTCNN (synthetic frame if omitted)")
+    args = parser.parse_args()
+
+    if args.current:
+        if not args.compare:
+            parser.error("--current needs --compare")
+        report = load_report(args.current)
+    else:
+        report = run_suite(args)
+        print_results(report)
+        if args.output:
+            directory = os.path.dirname(args.output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✓ Results saved to {args.output}")
+    if args.compare:
+        if compare(load_report(args.compare), report, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
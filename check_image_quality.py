@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+import cv2
+import numpy as np
+from config import (FACE_IMAGES_DIR, QUALITY_REPORT_FILE, QUALITY_WORKERS, QUALITY_BLUR_THRESHOLD,
+                    QUALITY_BRIGHTNESS_RANGE, QUALITY_MIN_FACE_SIZE, QUALITY_DUPLICATE_DISTANCE, QUALITY_SKIP_ISSUES)
+from face_utils import detect_faces, crop_faces, write_atomic
+from training_engine import IMAGE_EXTENSIONS, file_hash
+
+# Bump when analyze_image() changes so cached metrics are recomputed.
+METRICS_VERSION = 1
+# Faces down to this size are detected so that small ones can be reported rather than missed.
+DETECT_MIN_FACE_SIZE = 20
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(gray):
+    # 64-bit pHash: signs of the lowest 8x8 DCT frequencies of a 32x32 thumbnail, relative to their median.
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    return np.packbits(low > np.median(low[1:])).tobytes().hex()
+
+
+def analyze_image(image_path, detector):
+    image = cv2.imread(image_path)
+    if image is None:
+        return {'readable': False}
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    boxes, faces = crop_faces(rgb_image, detect_faces(detector, rgb_image, min_face_size=DETECT_MIN_FACE_SIZE))
+    metrics = {'readable': True, 'width': image.shape[1], 'height': image.shape[0], 'faces': len(boxes),
+               'face_size': None, 'phash': perceptual_hash(gray)}
+    if boxes:
+        # Sharpness and exposure are measured on the 160x160 crop training would use, so they
+        # do not depend on the photo's resolution or background.
+        largest = max(range(len(boxes)), key=lambda i: boxes[i][2] * boxes[i][3])
+        metrics['face_size'] = int(min(boxes[largest][2:]))
+        region = cv2.cvtColor(faces[largest], cv2.COLOR_RGB2GRAY)
+    else:
+        region = gray
+    metrics['blur'] = round(float(cv2.Laplacian(region, cv2.CV_64F).var()), 1)
+    metrics['brightness'] = round(float(region.mean()), 1)
+    metrics['clipped'] = round(float(np.mean((region <= 5) | (region >= 250))), 3)
+    return metrics
+
+
+_worker_detector = None
+
+
+def _init_worker():
+    global _worker_detector
+    from mtcnn import MTCNN
+    _worker_detector = MTCNN()
+
+
+def _analyze_in_worker(task):
+    rel_path, image_path = task
+    try:
+        return rel_path, analyze_image(image_path, _worker_detector), None
+    except Exception as e:
+        return rel_path, None, str(e)
+
+
+def _analyze_serial(tasks):
+    from mtcnn import MTCNN
+    detector = MTCNN()
+    for rel_path, image_path in tasks:
+        try:
+            yield rel_path, analyze_image(image_path, detector), None
+        except Exception as e:
+            yield rel_path, None, str(e)
+
+
+def load_cache(path, full=False):
+    if full or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable quality report {path}: {e}")
+        return {}
+    if report.get('metrics_version') != METRICS_VERSION:
+        return {}
+    return report.get('images', {})
+
+
+def list_dataset(image_dir):
+    images = []
+    for person_name in sorted(os.listdir(image_dir)):
+        person_dir = os.path.join(image_dir, person_name)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((f"{person_name}/{filename}", os.path.join(person_dir, filename)))
+    return images
+
+
+def find_duplicates(records, max_distance):
+    # Compares every pair of perceptual hashes, one row at a time, with a byte popcount table.
+    paths = [p for p in sorted(records) if records[p].get('phash')]
+    if len(paths) < 2:
+        return []
+    hashes = np.array([int(records[p]['phash'], 16) for p in paths], dtype=np.uint64)
+    pairs = []
+    for i in range(len(paths) - 1):
+        xor = (hashes[i+1:] ^ hashes[i]).view(np.uint8).reshape(-1, 8)
+        distances = _POPCOUNT[xor].sum(axis=1)
+        for j in np.flatnonzero(distances <= max_distance):
+            pairs.append((paths[i], paths[i + 1 + j], int(distances[j])))
+    return pairs
+
+
+def flag_duplicates(records, pairs):
+    # Near-duplicates of the same person form groups; only the sharpest image of each group is kept,
+    # so skipping duplicates never drops every copy. Matches across people are only reported.
+    group = {}
+
+    def root(path):
+        while group.get(path, path) != path:
+            path = group[path]
+        return path
+
+    for first, second, _ in pairs:
+        if first.split('/', 1)[0] == second.split('/', 1)[0] and root(first) != root(second):
+            group[root(second)] = root(first)
+    members = {}
+    for path in group:
+        members.setdefault(root(path), []).append(path)
+    for root_path, paths in members.items():
+        paths.append(root_path)
+        keeper = min(paths, key=lambda p: (-records[p]['blur'], p))
+        for path in paths:
+            if path != keeper:
+                records[path]['issues'].append('duplicate')
+                records[path]['duplicate_of'] = [keeper, int(_hamming(records[path], records[keeper]))]
+    for first, second, distance in pairs:
+        if first.split('/', 1)[0] != second.split('/', 1)[0] and 'duplicate_of' not in records[second]:
+            records[second]['issues'].append('cross_person_duplicate')
+            records[second]['duplicate_of'] = [first, distance]
+
+
+def _hamming(first, second):
+    return bin(int(first['phash'], 16) ^ int(second['phash'], 16)).count('1')
+
+
+def image_issues(record):
+    if not record['readable']:
+        return ['unreadable']
+    issues = []
+    if record['faces'] == 0:
+        issues.append('no_face')
+    elif record['faces'] > 1:
+        issues.append('multiple_faces')
+    if record['face_size'] is not None and record['face_size'] < QUALITY_MIN_FACE_SIZE:
+        issues.append('small_face')
+    if record['blur'] < QUALITY_BLUR_THRESHOLD:
+        issues.append('blurry')
+    low, high = QUALITY_BRIGHTNESS_RANGE
+    if record['brightness'] < low:
+        issues.append('dark')
+    elif record['brightness'] > high:
+        issues.append('bright')
+    return issues
+
+
+def describe(issue, record):
+    if issue == 'blurry':
+        return f"blurry (sharpness {record['blur']:.0f} < {QUALITY_BLUR_THRESHOLD:.0f})"
+    if issue in ('dark', 'bright'):
+        return f"{issue} (brightness {record['brightness']:.0f})"
+    if issue == 'multiple_faces':
+        return f"{record['faces']} faces"
+    if issue == 'small_face':
+        return f"small face ({record['face_size']} px < {QUALITY_MIN_FACE_SIZE})"
+    if issue in ('duplicate', 'cross_person_duplicate'):
+        other, distance = record['duplicate_of']
+        label = "near-duplicate" if issue == 'duplicate' else "near-duplicate of another person's image"
+        return f"{label}: {other} ({distance} bits)"
+    return issue.replace('_', ' ')
+
+
+def scan(image_dir=None, output=None, workers=None, full=False):
+    image_dir = image_dir or FACE_IMAGES_DIR
+    output = output or QUALITY_REPORT_FILE
+    if workers is None:
+        workers = QUALITY_WORKERS
+    if not os.path.isdir(image_dir):
+        print(f"Error: Image directory not found at {image_dir}")
+        return None
+    start_time = time.perf_counter()
+    cached = load_cache(output, full)
+    by_hash = {r['hash']: r for r in cached.values() if r.get('readable') is not None}
+    records = {}
+    tasks = []
+    for rel_path, image_path in list_dataset(image_dir):
+        stat = os.stat(image_path)
+        record = cached.get(rel_path)
+        if record is not None and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+            records[rel_path] = record
+            continue
+        # Changed or new file: a renamed or copied image still reuses the metrics stored under its content hash.
+        content_hash = file_hash(image_path)
+        known = by_hash.get(content_hash)
+        record = {k: v for k, v in known.items() if k not in ('size', 'mtime_ns')} if known else {'hash': content_hash}
+        record.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        records[rel_path] = record
+        if known is None:
+            tasks.append((rel_path, image_path))
+    reused = len(records) - len(tasks)
+    workers = min(workers, len(tasks))
+    if tasks:
+        print(f"Analyzing {len(tasks)} new or changed images ({reused} cached)...")
+    if workers > 1:
+        # Spawned (not forked) workers, like the other pools: the warm daemon calling this has TensorFlow loaded.
+        with multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker) as pool:
+            results = list(pool.imap_unordered(_analyze_in_worker, tasks, chunksize=4))
+    elif tasks:
+        results = list(_analyze_serial(tasks))
+    else:
+        results = []
+    failed = []
+    for rel_path, metrics, error in results:
+        if error is not None:
+            failed.append((rel_path, error))
+            del records[rel_path]
+            continue
+        records[rel_path].update(metrics)
+
+    for record in records.values():
+        record['issues'] = image_issues(record)
+        record.pop('duplicate_of', None)
+    flag_duplicates(records, find_duplicates(records, QUALITY_DUPLICATE_DISTANCE))
+
+    report = {'metrics_version': METRICS_VERSION, 'image_dir': image_dir,
+              'thresholds': {'blur': QUALITY_BLUR_THRESHOLD, 'brightness': list(QUALITY_BRIGHTNESS_RANGE),
+                             'min_face_size': QUALITY_MIN_FACE_SIZE, 'duplicate_distance': QUALITY_DUPLICATE_DISTANCE},
+              'images': records}
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_atomic(output, lambda f: f.write(json.dumps(report, indent=1).encode('utf-8')))
+    print_report(image_dir, records, failed, len(tasks), reused, time.perf_counter() - start_time, workers, output)
+    return report
+
+
+def print_report(image_dir, records, failed, analyzed, reused, seconds, workers, output):
+    people = sorted({rel_path.split('/', 1)[0] for rel_path in records})
+    print("=" * 60)
+    print(f"Image Quality Report: {image_dir}")
+    print(f"{len(records)} images, {len(people)} people")
+    print("=" * 60)
+    counts = {}
+    for person_name in people:
+        person_paths = [p for p in sorted(records) if p.split('/', 1)[0] == person_name]
+        flagged = [p for p in person_paths if records[p]['issues']]
+        faces = [records[p]['face_size'] for p in person_paths if records[p].get('face_size')]
+        median_face = f", median face {int(np.median(faces))} px" if faces else ""
+        print(f"\n{person_name}: {len(person_paths)} images, {len(flagged)} flagged{median_face}")
+        for rel_path in flagged:
+            record = records[rel_path]
+            print(f"  ✗ {rel_path.split('/', 1)[1]}: " + "; ".join(describe(issue, record) for issue in record['issues']))
+            for issue in record['issues']:
+                counts[issue] = counts.get(issue, 0) + 1
+    for rel_path, error in failed:
+        print(f"  ✗ {rel_path}: analysis failed ({error})")
+    skipped = sum(1 for record in records.values() if set(record['issues']) & set(QUALITY_SKIP_ISSUES))
+    print(f"\n{'=' * 60}")
+    print("Issues: " + (", ".join(f"{issue} {count}" for issue, count in sorted(counts.items())) or "none"))
+    if QUALITY_SKIP_ISSUES:
+        print(f"Training will skip {skipped} images (QUALITY_SKIP_ISSUES: {', '.join(QUALITY_SKIP_ISSUES)})")
+    where = f"{workers} workers" if workers > 1 else "main process"
+    print(f"Analyzed {analyzed} images ({where}), reused {reused} from cache in {seconds:.1f}s")
+    print(f"Machine-readable results: {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check FACE_IMAGES for blurry, badly exposed, faceless and duplicate images")
+    parser.add_argument('--dir', default=None, help="Dataset directory (default: FACE_IMAGES_DIR)")
+    parser.add_argument('--output', default=None, help="Machine-readable JSON results (default: QUALITY_REPORT_FILE)")
+    parser.add_argument('--workers', type=int, default=None, help="Analysis processes (default: QUALITY_WORKERS)")
+    parser.add_argument('--full', action='store_true', help="Ignore cached results and re-analyze every image")
+    args = parser.parse_args()
+    if scan(args.dir, args.output, args.workers, args.full) is None:
+        exit(1)
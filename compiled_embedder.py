@@ -0,0 +1,183 @@
+import os
+import json
+import shutil
+import time
+import cv2
+import numpy as np
+import tensorflow as tf
+from config import EMBEDDER_COMPILED, EMBEDDER_BATCH_SIZES, EMBEDDER_CACHE_DIR
+
+IMAGE_SIZE = 160
+
+
+def standardize(images, fixed_standardization=True):
+    images = images.astype(np.float32)
+    if fixed_standardization:
+        return (images - 127.5) / 127.5
+    # Per-image prewhitening, as keras-facenet does for the older model keys.
+    axes = tuple(range(1, images.ndim))
+    mean = images.mean(axis=axes, keepdims=True)
+    std = np.maximum(images.std(axis=axes, keepdims=True), 1.0 / np.sqrt(images[0].size))
+    return (images - mean) / std
+
+
+class CompiledEmbedder:
+    """Drop-in replacement for FaceNet.embeddings() that only calls pre-traced, fixed-shape graphs."""
+
+    def __init__(self, forward, batch_sizes, fixed_standardization=True, source="built"):
+        self.forward = forward
+        self.batch_sizes = tuple(sorted(batch_sizes))
+        self.fixed_standardization = fixed_standardization
+        self.source = source
+        # Keeps the model variables alive for as long as forward() may be called.
+        self.module = None
+        self.traces = 0
+        self.traces_at_load = 0
+        self.dim = None
+        self.cold_start_seconds = None
+        self.warm_ms = {}
+        self.calls = 0
+        self.padded = 0
+
+    def _batch_size(self, n):
+        for batch_size in self.batch_sizes:
+            if batch_size >= n:
+                return batch_size
+        return self.batch_sizes[-1]
+
+    def _run(self, inputs):
+        n = len(inputs)
+        batch_size = self._batch_size(n)
+        if n < batch_size:
+            # Pad to a traced shape; a new shape would trigger a retrace.
+            padded = np.zeros((batch_size,) + inputs.shape[1:], dtype=np.float32)
+            padded[:n] = inputs
+            inputs = padded
+            self.padded += batch_size - n
+        self.calls += 1
+        return self.forward(tf.constant(inputs)).numpy()[:n]
+
+    def embeddings(self, images):
+        if len(images) == 0:
+            return np.zeros((0, self.dim or 512), dtype=np.float32)
+        images = [image if image.shape[:2] == (IMAGE_SIZE, IMAGE_SIZE) else cv2.resize(image, (IMAGE_SIZE, IMAGE_SIZE))
+                  for image in images]
+        inputs = standardize(np.stack(images), self.fixed_standardization)
+        step = self.batch_sizes[-1]
+        return np.concatenate([self._run(inputs[start:start+step]) for start in range(0, len(inputs), step)])
+
+    def warm_up(self):
+        for batch_size in self.batch_sizes:
+            inputs = tf.zeros((batch_size, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32)
+            outputs = self.forward(inputs)
+            start = time.perf_counter()
+            self.forward(inputs).numpy()
+            self.warm_ms[batch_size] = (time.perf_counter() - start) * 1000.0
+            self.dim = int(outputs.shape[-1])
+
+    @property
+    def retraces(self):
+        return self.traces - self.traces_at_load
+
+    def report(self):
+        latency = ", ".join(f"batch {b} {ms:.1f} ms" for b, ms in self.warm_ms.items())
+        return (f"FaceNet ready in {self.cold_start_seconds:.1f}s ({self.source}); warm latency {latency}; "
+                f"{len(self.batch_sizes)} compiled input signatures")
+
+    def summary(self):
+        return (f"FaceNet: {self.calls} compiled calls, {self.padded} padded slots, "
+                f"{self.retraces} retraces after warm-up")
+
+
+def print_embedder_summary(embedder):
+    if isinstance(embedder, CompiledEmbedder):
+        print(embedder.summary())
+
+
+def _cache_path(cache_dir, batch_sizes):
+    return os.path.join(cache_dir, "facenet_b" + "-".join(str(b) for b in batch_sizes))
+
+
+def _load_cached(path, batch_sizes):
+    try:
+        with open(os.path.join(path, "embedder.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['tensorflow'] != tf.__version__ or tuple(meta['batch_sizes']) != batch_sizes:
+            return None
+        module = tf.saved_model.load(path)
+    except Exception:
+        return None
+    embedder = CompiledEmbedder(module.forward, batch_sizes, meta['fixed_standardization'], source="cached export")
+    embedder.module = module
+    return embedder
+
+
+def _build(batch_sizes):
+    from keras_facenet import FaceNet
+    facenet = FaceNet()
+    model = facenet.model
+    embedder = None
+
+    def forward(inputs):
+        # Runs only while tracing, so it counts traces rather than calls. Building and exporting trace
+        # each signature more than once; only traces after load (retraces) are reported.
+        embedder.traces += 1
+        return model(inputs, training=False)
+
+    function = tf.function(forward)
+    embedder = CompiledEmbedder(function, batch_sizes, facenet.metadata['fixed_image_standardization'])
+    for batch_size in batch_sizes:
+        function.get_concrete_function(tf.TensorSpec((batch_size, IMAGE_SIZE, IMAGE_SIZE, 3), tf.float32))
+    sample = np.random.default_rng(0).integers(0, 256, (2, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.uint8)
+    if not np.allclose(embedder.embeddings(sample), facenet.embeddings(sample), rtol=1e-3, atol=1e-4):
+        print("Warning: compiled FaceNet does not match keras-facenet output; using keras-facenet directly.")
+        return facenet, None
+    module = tf.Module()
+    module.model = model
+    module.forward = function
+    embedder.module = module
+    return embedder, module
+
+
+def _export(module, embedder, path):
+    # Several processes (e.g. parallel video workers) may export at once. Each writes its own
+    # directory and the first to rename it into place wins; an existing export is never removed,
+    # since another process may be loading it.
+    temp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        tf.saved_model.save(module, temp_path)
+        with open(os.path.join(temp_path, "embedder.json"), 'w', encoding='utf-8') as f:
+            json.dump({'tensorflow': tf.__version__, 'batch_sizes': list(embedder.batch_sizes),
+                       'fixed_standardization': embedder.fixed_standardization}, f)
+        if not os.path.exists(path):
+            os.rename(temp_path, path)
+    except Exception as e:
+        if not os.path.exists(path):
+            print(f"Warning: could not cache the compiled FaceNet in {path}: {e}")
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+def load_embedder(batch_sizes=None, cache_dir=None, compiled=None):
+    if compiled is None:
+        compiled = EMBEDDER_COMPILED
+    if not compiled:
+        from keras_facenet import FaceNet
+        return FaceNet()
+    start = time.perf_counter()
+    batch_sizes = tuple(sorted(EMBEDDER_BATCH_SIZES if batch_sizes is None else batch_sizes))
+    if cache_dir is None:
+        cache_dir = EMBEDDER_CACHE_DIR
+    path = _cache_path(cache_dir, batch_sizes) if cache_dir else None
+    embedder = _load_cached(path, batch_sizes) if path else None
+    if embedder is None:
+        embedder, module = _build(batch_sizes)
+        if module is None:
+            return embedder
+        if path:
+            _export(module, embedder, path)
+    embedder.warm_up()
+    embedder.traces_at_load = embedder.traces
+    embedder.cold_start_seconds = time.perf_counter() - start
+    print(embedder.report())
+    return embedder
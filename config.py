@@ -3,7 +3,96 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FACE_IMAGES_DIR = os.path.join(BASE_DIR, "FACE_IMAGES")
 TRAINED_MODEL_DIR = os.path.join(BASE_DIR, "Trained_Model")
+GALLERY_DIR = os.path.join(TRAINED_MODEL_DIR, "_gallery")
+TRAINING_CACHE_DIR = os.path.join(TRAINED_MODEL_DIR, "_cache")
+EMBEDDING_BATCH_SIZE = 32
+# FaceNet runs as a compiled graph traced once per size in EMBEDDER_BATCH_SIZES; calls are padded up
+# to the nearest size (larger calls are split by the largest). The traced graph is exported to
+# EMBEDDER_CACHE_DIR (None = no cache) so later runs skip building the Keras model.
+EMBEDDER_COMPILED = True
+EMBEDDER_BATCH_SIZES = (1, 4, 32)
+EMBEDDER_CACHE_DIR = os.path.join(TRAINED_MODEL_DIR, "_embedder")
+# Detection worker processes used during training (0 or 1 = detect in the main process).
+# Each worker loads its own MTCNN; at most TRAINING_QUEUE_SIZE images are in flight beyond the
+# next one handed to FaceNet, which bounds the full-resolution crops held in memory.
+TRAINING_WORKERS = 0
+TRAINING_QUEUE_SIZE = 64
+# check_image_quality.py analyzes FACE_IMAGES with QUALITY_WORKERS processes (0 or 1 = main process)
+# and caches each image's metrics by content hash in QUALITY_REPORT_FILE. An image is flagged blurry
+# below QUALITY_BLUR_THRESHOLD (Laplacian variance of the 160x160 face crop), dark/bright outside
+# QUALITY_BRIGHTNESS_RANGE (mean grey level of the face), small below QUALITY_MIN_FACE_SIZE pixels,
+# and a duplicate when its 64-bit perceptual hash is within QUALITY_DUPLICATE_DISTANCE bits of an
+# earlier image of the same person. Training skips images with any issue in QUALITY_SKIP_ISSUES
+# (empty = use every image); other issues are only reported.
+QUALITY_WORKERS = 4
+QUALITY_REPORT_FILE = os.path.join(TRAINING_CACHE_DIR, "quality.json")
+QUALITY_BLUR_THRESHOLD = 50.0
+QUALITY_BRIGHTNESS_RANGE = (40, 215)
+QUALITY_MIN_FACE_SIZE = 80
+QUALITY_DUPLICATE_DISTANCE = 4
+QUALITY_SKIP_ISSUES = ("blurry", "duplicate")
+# Processes that decode images and run MTCNN in image_recognition.py (0 or 1 = main process).
+IMAGE_WORKERS = 0
+# Variants produced per image by train_faces_enhanced.py, applied to the 160x160 crop.
+# Available: original, flip, bright, dark, rotate_plus, rotate_minus.
+AUGMENTATIONS = ("original", "flip", "bright", "dark", "rotate_plus", "rotate_minus")
 RECOGNITION_THRESHOLD = 0.85
 CAMERA_INDEX = 0
+# MTCNN runs on a copy of the frame whose longest side is at most DETECTION_MAX_SIDE pixels
+# (None = full resolution); boxes are mapped back so FaceNet crops use full-resolution pixels.
+# Faces smaller than MIN_FACE_SIZE full-frame pixels are not searched for.
+DETECTION_MAX_SIDE = 640
+MIN_FACE_SIZE = 40
+# Headless video recognition can split a file into VIDEO_SEGMENT_SECONDS segments processed by
+# VIDEO_WORKERS processes (each loads its own MTCNN and FaceNet). 1 = single process.
+VIDEO_WORKERS = 1
+VIDEO_SEGMENT_SECONDS = 60
+# Headless video sampling: analyze VIDEO_SAMPLE_FPS frames per second (None = every frame);
+# skipped frames are grabbed without decoding. SCENE_CHANGE_THRESHOLD (mean grey-level
+# difference, 0-255) also skips sampled frames that barely differ from the last analyzed one.
+VIDEO_SAMPLE_FPS = None
+SCENE_CHANGE_THRESHOLD = None
+# Seconds between checks of Trained_Model/ by running recognition sessions (0 disables hot reload)
+GALLERY_RELOAD_INTERVAL = 2.0
+# Face tracking between detection passes: detections are matched to tracks by IoU, a track is
+# dropped after TRACK_MAX_MISSED detection passes without a match, and its identity is
+# re-confirmed with FaceNet every TRACK_RECONFIRM_SECONDS.
+TRACK_IOU_THRESHOLD = 0.3
+TRACK_MAX_MISSED = 5
+TRACK_RECONFIRM_SECONDS = 2.0
+# Detection scheduling: the detection interval adapts to measured detection/embedding cost so
+# the display keeps TARGET_DISPLAY_FPS, while identities still update within MAX_IDENTITY_LATENCY_MS.
+TARGET_DISPLAY_FPS = 24
+MAX_IDENTITY_LATENCY_MS = 500
+# Live recognition side work runs off the frame loop: screenshots are written to SCREENSHOT_DIR,
+# and the IP geolocation is refreshed every GEOLOCATION_TTL_SECONDS (retried after
+# GEOLOCATION_RETRY_SECONDS when offline, each lookup giving up after GEOLOCATION_TIMEOUT seconds).
+SCREENSHOT_DIR = os.path.join(BASE_DIR, "Screenshots")
+GEOLOCATION_TTL_SECONDS = 600
+GEOLOCATION_RETRY_SECONDS = 60
+GEOLOCATION_TIMEOUT = 5
+# recognition_server.py prints per-stream and overall throughput every SERVER_REPORT_INTERVAL seconds.
+SERVER_REPORT_INTERVAL = 5.0
 WINDOW_INITIAL_WIDTH = 1280
 WINDOW_INITIAL_HEIGHT = 720
+
+# Matching backend: "exact" scans the whole gallery, "ivf" uses the inverted-file
+# index built at training time. IVF_PROBES trades recall for speed (more = slower,
+# closer to exact). Galleries smaller than IVF_MIN_GALLERY_SIZE always use exact search.
+# "prefilter" scores per-identity prototypes first and re-ranks only the closest
+# identities; it returns the same matches as "exact". It only pays off when people have
+# many embeddings each: galleries whose prototypes exceed PREFILTER_MAX_PROTOTYPE_FRACTION
+# of the embeddings use exact search instead.
+MATCH_INDEX = "exact"
+IVF_LISTS = None
+IVF_PROBES = 8
+IVF_MIN_GALLERY_SIZE = 5000
+PROTOTYPES_PER_IDENTITY = 2
+PREFILTER_TOP_IDENTITIES = 5
+PREFILTER_MAX_PROTOTYPE_FRACTION = 0.1
+
+# Gallery search precision: "float32", "float16" or "int8" (per-dimension scaled).
+# Quantized galleries re-rank their QUANTIZED_RERANK closest candidates in float32;
+# set it to 0 to search the quantized matrix only.
+GALLERY_STORAGE = "float32"
+QUANTIZED_RERANK = 20
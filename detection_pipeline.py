@@ -0,0 +1,109 @@
+import queue
+import logging
+import multiprocessing
+import cv2
+
+_detector = None
+
+
+def load_face(image_path, detector, box=None):
+    image = cv2.imread(image_path)
+    if image is None:
+        return None, None, 'unreadable'
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if box is None:
+        results = detector.detect_faces(image_rgb)
+        if not results:
+            return None, None, 'no_face'
+        x1, y1, width, height = results[0]['box']
+        box = [abs(x1), abs(y1), width, height]
+    x1, y1, width, height = box
+    return image_rgb[y1:y1+height, x1:x1+width], box, 'ok'
+
+
+def _get_detector():
+    global _detector
+    if _detector is None:
+        from mtcnn import MTCNN
+        _detector = MTCNN()
+    return _detector
+
+
+def _detect_worker(task_queue, result_queue):
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        index, image_path, box = task
+        try:
+            detector = _get_detector() if box is None else None
+            face, box, status = load_face(image_path, detector, box)
+            result_queue.put((index, face, box, status, None))
+        except Exception as e:
+            result_queue.put((index, None, None, 'error', str(e)))
+
+
+def detect_serial(jobs, models):
+    for index, (image_path, box) in enumerate(jobs):
+        try:
+            detector = models.load()[0] if box is None else None
+            face, box, status = load_face(image_path, detector, box)
+            yield index, face, box, status, None
+        except Exception as e:
+            yield index, None, None, 'error', str(e)
+
+
+def detect_parallel(jobs, workers, queue_size):
+    # Spawned, not forked: the caller (e.g. the GUI daemon) may already hold an initialized
+    # TensorFlow, which is not fork-safe.
+    context = multiprocessing.get_context('spawn')
+    task_queue = context.Queue()
+    result_queue = context.Queue()
+    processes = [context.Process(target=_detect_worker, args=(task_queue, result_queue), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # At most `window` images are in flight beyond the next one to yield, so a slow early image
+    # cannot make every later full-resolution crop pile up in the reorder buffer.
+    window = max(queue_size, workers)
+    submitted = 0
+
+    def submit_until(limit):
+        nonlocal submitted
+        while submitted < min(limit, len(jobs)):
+            image_path, box = jobs[submitted]
+            task_queue.put((submitted, image_path, box))
+            submitted += 1
+            if submitted == len(jobs):
+                for _ in processes:
+                    task_queue.put(None)
+
+    logging.info(f"Detecting faces in {len(jobs)} images with {workers} worker processes")
+    pending = {}
+    next_index = 0
+    submit_until(window)
+    try:
+        for _ in range(len(jobs)):
+            while True:
+                try:
+                    result = result_queue.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError("Detection workers exited before finishing all images")
+            pending[result[0]] = result
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+                submit_until(next_index + window)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def detect_faces_in_images(jobs, models, workers=0, queue_size=64):
+    if workers > 1 and len(jobs) > 1:
+        return detect_parallel(jobs, min(workers, len(jobs)), queue_size)
+    return detect_serial(jobs, models)
@@ -1,17 +1,33 @@
 import cv2
-import numpy as np
+import time
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
-from config import RECOGNITION_THRESHOLD
-from face_utils import load_embeddings, find_best_match
+from compiled_embedder import load_embedder, print_embedder_summary
+from config import RECOGNITION_THRESHOLD, MATCH_INDEX
+from face_utils import load_gallery, detect_faces
+from face_tracker import FaceTracker, identify_tracks
+from stream_utils import DetectionScheduler
+from gallery_watcher import GalleryWatcher
 
-def diagnose_recognition():
-    known_embeddings, known_folder_names, person_info = load_embeddings()
-    if known_embeddings is None:
+def print_match_stats(stats, n_faces=None):
+    comparisons = stats.get('comparisons', 0)
+    exhaustive = stats.get('exhaustive', 0)
+    if exhaustive == 0:
+        return
+    avoided = exhaustive - comparisons
+    faces_text = f" for {n_faces} face(s)" if n_faces is not None else ""
+    print(f"Matching [{MATCH_INDEX}]: {comparisons} comparisons{faces_text}, "
+          f"{avoided} avoided vs exhaustive {exhaustive} ({100.0 * avoided / exhaustive:.1f}%)")
+
+def diagnose_recognition(detector=None, embedder=None, gallery=None, on_first_frame=None):
+    if gallery is None:
+        gallery = load_gallery()
+    if gallery is None:
         return
     try:
-        embedder = FaceNet()
-        detector = MTCNN()
+        if embedder is None:
+            embedder = load_embedder()
+        if detector is None:
+            detector = MTCNN()
     except Exception as e:
         print(f"Error initializing models: {e}")
         return
@@ -28,58 +44,72 @@ def diagnose_recognition():
     print("- Lower distance = better match")
     print("- Press 'q' to quit")
     print("="*60 + "\n")
+    watcher = GalleryWatcher(gallery).start()
+    tracker = FaceTracker()
+    scheduler = DetectionScheduler()
+    gallery_version = watcher.version
+    session_stats = {}
+    frame_idx = 0
     while True:
         ret, frame = cap.read()
         if not ret:
             break
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        try:
-            results = detector.detect_faces(rgb_frame)
-            if results:
-                for result in results:
-                    x, y, w, h = result['box']
-                    x, y = abs(x), abs(y)
-                    face = rgb_frame[y:y+h, x:x+w]
-                    try:
-                        face = cv2.resize(face, (160, 160))
-                        face_pixels = np.expand_dims(face, axis=0)
-                        embedding = embedder.embeddings(face_pixels)[0]
-                        distances = np.linalg.norm(known_embeddings - embedding, axis=1)
-                        person_distances = {}
-                        for i, folder_name in enumerate(known_folder_names):
-                            if folder_name not in person_distances:
-                                person_distances[folder_name] = []
-                            person_distances[folder_name].append(float(distances[i]))
-                        print("\n" + "-"*60)
-                        print("Face Detected - Distance Scores:")
-                        print("-"*60)
-                        min_distances = []
-                        for folder_name in sorted(person_distances.keys()):
-                            min_dist = min(person_distances[folder_name])
-                            display_name = person_info[folder_name][0] if folder_name in person_info else folder_name
-                            min_distances.append((min_dist, folder_name, display_name))
-                        min_distances.sort()
-                        for i, (dist, folder_name, display_name) in enumerate(min_distances[:5], 1):
-                            status = "✓ MATCH" if dist < RECOGNITION_THRESHOLD else "✗ No match"
-                            print(f"{i}. {display_name:20s} - Distance: {dist:.3f} {status}")
-                        best_dist, best_folder, best_name = min_distances[0]
-                        if best_dist < RECOGNITION_THRESHOLD:
-                            color = (0, 0, 255)
-                            label = f"{best_name} ({best_dist:.2f})"
-                        else:
-                            color = (0, 255, 0)
-                            label = f"Unknown ({best_dist:.2f})"
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                        cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    except Exception:
-                        continue
-        except Exception:
-            pass
+        timestamp = time.perf_counter()
+        frame_idx += 1
+        gallery = watcher.gallery
+        person_info = gallery.person_info
+        if watcher.version != gallery_version:
+            gallery_version = watcher.version
+            tracker.clear_identities()
+        if scheduler.should_run(frame_idx):
+            try:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                results = detect_faces(detector, rgb_frame)
+                scheduler.record('detect', (time.perf_counter() - timestamp) * 1000.0)
+                frame_stats = {}
+                tracks, top_matches = identify_tracks(rgb_frame, results, tracker, embedder, gallery, timestamp,
+                                                      top_k=5, stats=frame_stats, scheduler=scheduler)
+                for i, matches in top_matches.items():
+                    print("\n" + "-"*60)
+                    print(f"Face Detected (track #{tracks[i].track_id}) - Distance Scores:")
+                    print("-"*60)
+                    for rank, (folder_name, dist) in enumerate(matches, 1):
+                        display_name = person_info[folder_name][0] if folder_name in person_info else folder_name
+                        status = "✓ MATCH" if dist < RECOGNITION_THRESHOLD else "✗ No match"
+                        print(f"{rank}. {display_name:20s} - Distance: {dist:.3f} {status}")
+                if top_matches:
+                    print_match_stats(frame_stats, len(top_matches))
+                    for key, value in frame_stats.items():
+                        session_stats[key] = session_stats.get(key, 0) + value
+            except Exception:
+                pass
+        render_start = time.perf_counter()
+        for face_data in tracker.face_data(timestamp):
+            x, y, w, h = face_data['box']
+            color = (0, 0, 255) if face_data['is_known'] else (0, 255, 0)
+            label = f"#{face_data['track_id']} {face_data['name']}"
+            if face_data.get('distance') is not None:
+                label += f" ({face_data['distance']:.2f})"
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        cv2.putText(frame, watcher.status_text(), (10, frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+        cv2.putText(frame, scheduler.status_text(), (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
         cv2.imshow('Diagnostic Mode - Press Q to quit', frame)
+        if on_first_frame is not None:
+            on_first_frame()
+            on_first_frame = None
+        scheduler.record('render', (time.perf_counter() - render_start) * 1000.0)
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
+    watcher.stop()
     cap.release()
     cv2.destroyAllWindows()
+    if session_stats:
+        print("\n" + "="*60)
+        print("Session matching summary:")
+        print_match_stats(session_stats)
+    print(tracker.summary())
+    print_embedder_summary(embedder)
 
 
 
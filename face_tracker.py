@@ -0,0 +1,147 @@
+import time
+import threading
+import numpy as np
+from config import RECOGNITION_THRESHOLD, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_RECONFIRM_SECONDS
+from face_utils import crop_faces, find_best_matches
+
+MAX_PREDICTION_SECONDS = 0.5
+
+
+def box_iou(box_a, box_b):
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+class Track:
+    def __init__(self, track_id, box, timestamp):
+        self.track_id = track_id
+        self.box = np.array(box, dtype=np.float64)
+        self.velocity = np.zeros(2)
+        self.updated_at = timestamp
+        self.identity = None
+        self.identified_at = None
+        self.misses = 0
+
+    def predicted_box(self, timestamp):
+        dt = min(max(timestamp - self.updated_at, 0.0), MAX_PREDICTION_SECONDS)
+        box = self.box.copy()
+        box[:2] += self.velocity * dt
+        return box
+
+    def update(self, box, timestamp):
+        box = np.array(box, dtype=np.float64)
+        dt = timestamp - self.updated_at
+        if dt > 0:
+            # Constant-velocity model on the box corner, smoothed to damp detector jitter.
+            velocity = (box[:2] - self.box[:2]) / dt
+            self.velocity = 0.5 * self.velocity + 0.5 * velocity
+        self.box = box
+        self.updated_at = timestamp
+        self.misses = 0
+
+    def face_data(self, timestamp):
+        x, y, w, h = (int(round(v)) for v in self.predicted_box(timestamp))
+        identity = self.identity or {'name': "Unknown", 'age': "N/A", 'is_known': False, 'folder': None, 'distance': None}
+        return dict(identity, box=(x, y, w, h), track_id=self.track_id)
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=None, max_missed=None, reconfirm_seconds=None):
+        self.iou_threshold = TRACK_IOU_THRESHOLD if iou_threshold is None else iou_threshold
+        self.max_missed = TRACK_MAX_MISSED if max_missed is None else max_missed
+        self.reconfirm_seconds = TRACK_RECONFIRM_SECONDS if reconfirm_seconds is None else reconfirm_seconds
+        self.tracks = []
+        self.next_id = 1
+        self.faces_detected = 0
+        self.faces_embedded = 0
+        self._lock = threading.Lock()
+
+    def update(self, boxes, timestamp):
+        with self._lock:
+            pairs = []
+            for t_idx, track in enumerate(self.tracks):
+                predicted = track.predicted_box(timestamp)
+                for b_idx, box in enumerate(boxes):
+                    iou = box_iou(predicted, box)
+                    if iou >= self.iou_threshold:
+                        pairs.append((iou, t_idx, b_idx))
+            pairs.sort(reverse=True)
+            assigned = [None] * len(boxes)
+            used_tracks = set()
+            for iou, t_idx, b_idx in pairs:
+                if t_idx in used_tracks or assigned[b_idx] is not None:
+                    continue
+                used_tracks.add(t_idx)
+                assigned[b_idx] = self.tracks[t_idx]
+                self.tracks[t_idx].update(boxes[b_idx], timestamp)
+            for t_idx, track in enumerate(self.tracks):
+                if t_idx not in used_tracks:
+                    track.misses += 1
+            self.tracks = [track for track in self.tracks if track.misses <= self.max_missed]
+            for b_idx, box in enumerate(boxes):
+                if assigned[b_idx] is None:
+                    track = Track(self.next_id, box, timestamp)
+                    self.next_id += 1
+                    self.tracks.append(track)
+                    assigned[b_idx] = track
+            self.faces_detected += len(boxes)
+            return assigned
+
+    def needs_embedding(self, track, timestamp):
+        return track.identity is None or timestamp - track.identified_at >= self.reconfirm_seconds
+
+    def set_identity(self, track, identity, timestamp):
+        with self._lock:
+            track.identity = identity
+            track.identified_at = timestamp
+            self.faces_embedded += 1
+
+    def clear_identities(self):
+        with self._lock:
+            for track in self.tracks:
+                track.identity = None
+
+    def face_data(self, timestamp, visible_only=True):
+        with self._lock:
+            return [track.face_data(timestamp) for track in self.tracks
+                    if not visible_only or track.misses == 0]
+
+    def summary(self):
+        if not self.faces_detected:
+            return "Tracker: no faces detected"
+        avoided = self.faces_detected - self.faces_embedded
+        return (f"Tracker: {self.faces_embedded} FaceNet embeddings for {self.faces_detected} detected faces "
+                f"({100.0 * avoided / self.faces_detected:.1f}% avoided), {self.next_id - 1} tracks")
+
+
+def face_identity(folder_name, person_info, distance):
+    if folder_name is None:
+        return {'name': "Unknown", 'age': "N/A", 'is_known': False, 'folder': None, 'distance': float(distance)}
+    display_name, age = person_info.get(folder_name, (folder_name, "N/A"))
+    return {'name': display_name, 'age': age, 'is_known': True, 'folder': folder_name, 'distance': float(distance)}
+
+
+def identify_tracks(rgb_frame, detections, tracker, embedder, gallery, timestamp, top_k=None, stats=None,
+                    scheduler=None):
+    boxes, faces = crop_faces(rgb_frame, detections)
+    tracks = tracker.update(boxes, timestamp)
+    pending = [i for i, track in enumerate(tracks) if tracker.needs_embedding(track, timestamp)]
+    top_matches = {}
+    start = time.perf_counter()
+    if pending:
+        embeddings = embedder.embeddings(np.stack([faces[i] for i in pending]))
+        folder_names, distances, matches = find_best_matches(embeddings, gallery, RECOGNITION_THRESHOLD,
+                                                             top_k=top_k, stats=stats)
+        for j, i in enumerate(pending):
+            tracker.set_identity(tracks[i], face_identity(folder_names[j], gallery.person_info, distances[j]), timestamp)
+            if matches is not None:
+                top_matches[i] = matches[j]
+    if scheduler is not None:
+        scheduler.record('embed', (time.perf_counter() - start) * 1000.0)
+    return tracks, top_matches
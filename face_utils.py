@@ -1,39 +1,542 @@
 import os
+import json
+import time
+import shutil
 import numpy as np
-from config import TRAINED_MODEL_DIR, RECOGNITION_THRESHOLD
+import cv2
+from config import (TRAINED_MODEL_DIR, GALLERY_DIR, RECOGNITION_THRESHOLD,
+                    MATCH_INDEX, IVF_LISTS, IVF_PROBES, IVF_MIN_GALLERY_SIZE,
+                    PROTOTYPES_PER_IDENTITY, PREFILTER_TOP_IDENTITIES, PREFILTER_MAX_PROTOTYPE_FRACTION,
+                    GALLERY_STORAGE, QUANTIZED_RERANK, DETECTION_MAX_SIDE, MIN_FACE_SIZE)
+from ann_index import IVFIndex, kmeans
 
+GALLERY_IDENTITIES_FILE = os.path.join(GALLERY_DIR, "identities.json")
+# Each build writes its arrays to a new GALLERY_DIR/v<time>-<pid>/ directory and then points
+# identities.json at it. Files other processes keep memory-mapped are never replaced in place
+# (Windows refuses that); older versions are deleted once nothing maps them any more.
+GALLERY_FILES = {
+    'embeddings': "embeddings.npy",
+    'labels': "labels.npy",
+    'sq_norms': "sq_norms.npy",
+    'prototypes': "prototypes.npz",
+    'ivf': "ivf_index.npz",
+    'quantized': f"embeddings_{GALLERY_STORAGE}.npy",
+    'quantized_meta': f"quantized_{GALLERY_STORAGE}.npz",
+}
+SCORE_CHUNK_SIZE = 16384
 
-def load_embeddings():
-    all_embeddings = []
-    all_folder_names = []
-    person_info = {}
+
+class Gallery:
+    def __init__(self, embeddings, labels, identities, sq_norms=None, prototypes=None, quantized=None,
+                 rerank=None, version=None):
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+        self.embeddings = embeddings
+        self.labels = labels
+        self.sq_norms = sq_norms
+        self.identities = identities
+        self.identity_names = np.array([identity[0] for identity in identities])
+        self.person_info = {identity[0]: (identity[1], identity[2]) for identity in identities}
+        self.offsets = np.searchsorted(labels, np.arange(len(identities) + 1))
+        self.version = version
+        self.index = None
+        self.prototypes = None
+        if prototypes is not None:
+            self.prototypes, self.prototype_labels, self.prototype_radii = prototypes
+            self.prototype_sq_norms = np.einsum('ij,ij->i', self.prototypes, self.prototypes)
+            self.prototype_offsets = np.searchsorted(self.prototype_labels, np.arange(len(identities) + 1))
+        self.search_embeddings = embeddings
+        self.search_scale = None
+        self.search_sq_norms = sq_norms
+        self.rerank = 0
+        if quantized is not None:
+            self.search_embeddings, self.search_scale, self.search_sq_norms = quantized
+            self.rerank = QUANTIZED_RERANK if rerank is None else rerank
+
+    @property
+    def storage(self):
+        return str(self.search_embeddings.dtype)
+
+    @property
+    def is_quantized(self):
+        return self.search_embeddings is not self.embeddings
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def folder_names(self):
+        return self.identity_names[self.labels]
+
+
+def list_encoding_files():
+    encoding_files = []
     if not os.path.exists(TRAINED_MODEL_DIR):
-        print(f"Error: Trained Model directory not found at {TRAINED_MODEL_DIR}")
-        return None, None, None
-    for person_folder in os.listdir(TRAINED_MODEL_DIR):
-        person_path = os.path.join(TRAINED_MODEL_DIR, person_folder)
-        if not os.path.isdir(person_path):
-            continue
-        encodings_file = os.path.join(person_path, "encodings.npz")
-        if os.path.exists(encodings_file):
+        return encoding_files
+    for person_folder in sorted(os.listdir(TRAINED_MODEL_DIR)):
+        encodings_file = os.path.join(TRAINED_MODEL_DIR, person_folder, "encodings.npz")
+        if os.path.isfile(encodings_file):
+            encoding_files.append((person_folder, encodings_file))
+    return encoding_files
+
+
+def _source_signature(encodings_file):
+    stat = os.stat(encodings_file)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_identity_table():
+    with open(GALLERY_IDENTITIES_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _gallery_file(version, name):
+    return os.path.join(GALLERY_DIR, version, GALLERY_FILES[name])
+
+
+def gallery_is_stale(encoding_files=None):
+    if encoding_files is None:
+        encoding_files = list_encoding_files()
+    try:
+        table = _read_identity_table()
+        version = table['version']
+        sources = table['sources']
+    except (OSError, ValueError, KeyError):
+        return True
+    required = ['embeddings', 'labels', 'sq_norms', 'prototypes']
+    if GALLERY_STORAGE != "float32":
+        required += ['quantized', 'quantized_meta']
+    for name in required:
+        if not os.path.exists(_gallery_file(version, name)):
+            return True
+    if len(sources) != len(encoding_files):
+        return True
+    for person_folder, encodings_file in encoding_files:
+        if sources.get(person_folder) != _source_signature(encodings_file):
+            return True
+    return False
+
+
+def _version_time(version):
+    try:
+        return int(version[1:].split('-')[0]) if version.startswith('v') else None
+    except ValueError:
+        return None
+
+
+def _remove_old_versions(current):
+    for entry in os.listdir(GALLERY_DIR):
+        path = os.path.join(GALLERY_DIR, entry)
+        if os.path.isdir(path):
+            version_time = _version_time(entry)
+            # A newer directory belongs to a build another process is still writing.
+            if version_time is not None and version_time < _version_time(current):
+                shutil.rmtree(path, ignore_errors=True)
+        elif entry.endswith(('.npy', '.npz')):
+            # Arrays of the old unversioned layout; on Windows they stay until no session maps them.
             try:
-                data = np.load(encodings_file)
-                embeddings = data['embeddings']
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def build_prototypes(embeddings, offsets, per_identity=None):
+    if per_identity is None:
+        per_identity = PROTOTYPES_PER_IDENTITY
+    vectors = []
+    labels = []
+    radii = []
+    for identity_id in range(len(offsets) - 1):
+        members = np.asarray(embeddings[offsets[identity_id]:offsets[identity_id+1]], dtype=np.float32)
+        n_prototypes = max(1, min(per_identity, len(members) // 4))
+        if n_prototypes == 1:
+            centers = members.mean(axis=0, keepdims=True)
+        else:
+            centers = kmeans(members, n_prototypes, seed=identity_id)
+        member_distances = np.linalg.norm(members[:, None, :] - centers[None, :, :], axis=2)
+        assignment = np.argmin(member_distances, axis=1)
+        for center_id, center in enumerate(centers):
+            assigned = member_distances[assignment == center_id, center_id]
+            if len(assigned) == 0:
+                continue
+            vectors.append(center)
+            labels.append(identity_id)
+            radii.append(assigned.max())
+    return (np.array(vectors, dtype=np.float32), np.array(labels, dtype=np.int32),
+            np.array(radii, dtype=np.float32))
+
+
+def quantize_embeddings(embeddings, storage):
+    if storage == "float16":
+        quantized = embeddings.astype(np.float16)
+        scale = None
+        restored = quantized.astype(np.float32)
+    elif storage == "int8":
+        scale = np.abs(embeddings).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        scale = scale.astype(np.float32)
+        quantized = np.clip(np.rint(embeddings / scale), -127, 127).astype(np.int8)
+        restored = quantized * scale
+    else:
+        raise ValueError(f"Unsupported gallery storage: {storage}")
+    return quantized, scale, np.einsum('ij,ij->i', restored, restored)
+
+
+def build_gallery(encoding_files=None):
+    if encoding_files is None:
+        encoding_files = list_encoding_files()
+    blocks = []
+    identities = []
+    sources = {}
+    for person_folder, encodings_file in encoding_files:
+        try:
+            sources[person_folder] = _source_signature(encodings_file)
+            with np.load(encodings_file) as data:
+                embeddings = np.asarray(data['embeddings'], dtype=np.float32)
                 folder_name = str(data.get('folder_name', data.get('name', person_folder)))
                 display_name = str(data.get('name', folder_name))
                 age = str(data.get('age', 'N/A'))
-                person_info[folder_name] = (display_name, age)
-                for embedding in embeddings:
-                    all_embeddings.append(embedding)
-                    all_folder_names.append(folder_name)
-                print(f"Loaded {len(embeddings)} embeddings for '{display_name}' (Age: {age})")
-            except Exception as e:
-                print(f"Error loading {encodings_file}: {e}")
-    if not all_embeddings:
+        except Exception as e:
+            print(f"Error loading {encodings_file}: {e}")
+            continue
+        if embeddings.ndim != 2 or len(embeddings) == 0:
+            continue
+        blocks.append(embeddings)
+        identities.append([folder_name, display_name, age])
+    if not blocks:
+        return None
+    embeddings = np.ascontiguousarray(np.concatenate(blocks), dtype=np.float32)
+    labels = np.repeat(np.arange(len(blocks), dtype=np.int32), [len(block) for block in blocks])
+    sq_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+    offsets = np.searchsorted(labels, np.arange(len(identities) + 1))
+    prototypes = build_prototypes(embeddings, offsets)
+    quantized = None
+    if GALLERY_STORAGE != "float32":
+        quantized = quantize_embeddings(embeddings, GALLERY_STORAGE)
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    table = {'identities': identities, 'sources': sources, 'version': version}
+    try:
+        os.makedirs(os.path.join(GALLERY_DIR, version))
+        np.save(_gallery_file(version, 'embeddings'), embeddings)
+        np.save(_gallery_file(version, 'labels'), labels)
+        np.save(_gallery_file(version, 'sq_norms'), sq_norms)
+        np.savez(_gallery_file(version, 'prototypes'),
+                 prototypes=prototypes[0], labels=prototypes[1], radii=prototypes[2])
+        if quantized is not None:
+            np.save(_gallery_file(version, 'quantized'), quantized[0])
+            np.savez(_gallery_file(version, 'quantized_meta'),
+                     scale=quantized[1] if quantized[1] is not None else np.empty(0, dtype=np.float32),
+                     sq_norms=quantized[2])
+        # The version becomes visible to readers only once all of its arrays are complete.
+        write_atomic(GALLERY_IDENTITIES_FILE, lambda f: f.write(json.dumps(table).encode('utf-8')))
+        print(f"Gallery index written: {len(embeddings)} embeddings from {len(identities)} people -> {GALLERY_DIR}")
+    except OSError as e:
+        print(f"Warning: could not write gallery index to {GALLERY_DIR}: {e}")
+        version = None
+    gallery = Gallery(embeddings, labels, identities, sq_norms, prototypes, quantized, version=version)
+    attach_ann_index(gallery, rebuild=True)
+    if version is not None:
+        _remove_old_versions(version)
+    return gallery
+
+
+def attach_ann_index(gallery, rebuild=False):
+    if MATCH_INDEX != "ivf" or len(gallery) < IVF_MIN_GALLERY_SIZE:
+        return
+    ivf_file = _gallery_file(gallery.version, 'ivf') if gallery.version else None
+    if not rebuild and ivf_file:
+        try:
+            index = IVFIndex.load(ivf_file)
+            # A saved index built with another IVF_LISTS setting is rebuilt rather than reused.
+            if len(index) == len(gallery) and index.n_lists == IVFIndex.list_count(len(gallery), IVF_LISTS):
+                gallery.index = index
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+    print(f"Building IVF index for {len(gallery)} embeddings...")
+    gallery.index = IVFIndex.build(gallery.embeddings, IVF_LISTS)
+    if ivf_file is None:
+        return
+    try:
+        # Written into the gallery's own version directory, so it always matches those embeddings.
+        write_atomic(ivf_file, gallery.index.save)
+    except OSError as e:
+        print(f"Warning: could not write IVF index to {ivf_file}: {e}")
+
+
+def _open_gallery():
+    table = _read_identity_table()
+    version = table['version']
+    with np.load(_gallery_file(version, 'prototypes')) as data:
+        prototypes = (data['prototypes'], data['labels'], data['radii'])
+    quantized = None
+    if GALLERY_STORAGE != "float32":
+        with np.load(_gallery_file(version, 'quantized_meta')) as data:
+            scale = data['scale'] if len(data['scale']) else None
+            quantized = (np.load(_gallery_file(version, 'quantized'), mmap_mode='r'), scale, data['sq_norms'])
+    return Gallery(
+        np.load(_gallery_file(version, 'embeddings'), mmap_mode='r'),
+        np.load(_gallery_file(version, 'labels'), mmap_mode='r'),
+        table['identities'],
+        np.load(_gallery_file(version, 'sq_norms'), mmap_mode='r'),
+        prototypes,
+        quantized,
+        version=version,
+    )
+
+
+def load_gallery():
+    if not os.path.exists(TRAINED_MODEL_DIR):
+        print(f"Error: Trained Model directory not found at {TRAINED_MODEL_DIR}")
+        return None
+    encoding_files = list_encoding_files()
+    built = None
+    if gallery_is_stale(encoding_files):
+        print("Gallery index is missing or out of date, rebuilding...")
+        built = build_gallery(encoding_files)
+        if built is None:
+            print("Error: No trained models found. Please run train_faces.py first.")
+            return None
+    if built is not None and gallery_is_stale(encoding_files):
+        gallery = built
+    else:
+        try:
+            try:
+                gallery = _open_gallery()
+            except OSError:
+                # Another build may have removed the version between reading identities.json and its arrays.
+                gallery = _open_gallery()
+        except Exception as e:
+            if built is None:
+                print(f"Error loading gallery index: {e}")
+                return None
+            gallery = built
+    if len(gallery) == 0:
         print("Error: No trained models found. Please run train_faces.py first.")
+        return None
+    if built is not None and gallery is not built and gallery.version == built.version:
+        # Reopened from the files just written: reuse the index build_gallery already attached.
+        gallery.index = built.index
+    if gallery.index is None:
+        attach_ann_index(gallery)
+    print(f"Total loaded: {len(gallery)} embeddings from {len(gallery.person_info)} people ({gallery.storage})")
+    return gallery
+
+
+def load_embeddings():
+    gallery = load_gallery()
+    if gallery is None:
         return None, None, None
-    print(f"Total loaded: {len(all_embeddings)} embeddings from {len(person_info)} people")
-    return np.array(all_embeddings), np.array(all_folder_names), person_info
+    return gallery.embeddings, gallery.folder_names, gallery.person_info
+
+
+def set_min_face_size(detector, min_face_size):
+    # mtcnn 0.1.x keeps min_face_size on the detector; 1.x takes it as a detect_faces() argument.
+    if hasattr(detector, '_min_face_size'):
+        detector._min_face_size = min_face_size
+        return {}
+    return {'min_face_size': min_face_size}
+
+
+def detect_faces(detector, rgb_frame, max_side=None, min_face_size=None):
+    if max_side is None:
+        max_side = DETECTION_MAX_SIDE
+    if min_face_size is None:
+        min_face_size = MIN_FACE_SIZE
+    height, width = rgb_frame.shape[:2]
+    scale = 1.0
+    image = rgb_frame
+    if max_side and max(height, width) > max_side:
+        scale = max_side / float(max(height, width))
+        image = cv2.resize(rgb_frame, (int(round(width * scale)), int(round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    kwargs = set_min_face_size(detector, max(12, int(min_face_size * scale)))
+    results = detector.detect_faces(image, **kwargs)
+    if scale == 1.0:
+        return results
+    # Map boxes and landmarks back to the full-resolution frame so crops keep every pixel.
+    for result in results:
+        result['box'] = [int(round(v / scale)) for v in result['box']]
+        if 'keypoints' in result:
+            result['keypoints'] = {name: (int(round(px / scale)), int(round(py / scale)))
+                                   for name, (px, py) in result['keypoints'].items()}
+    return results
+
+
+def crop_faces(rgb_frame, results):
+    boxes = []
+    faces = []
+    for result in results:
+        x, y, w, h = result['box']
+        x, y = abs(x), abs(y)
+        face = rgb_frame[y:y+h, x:x+w]
+        if face.size == 0:
+            continue
+        boxes.append((x, y, w, h))
+        faces.append(cv2.resize(face, (160, 160)))
+    return boxes, faces
+
+
+def _scaled_probes(probes, gallery):
+    if gallery.search_scale is None:
+        return probes
+    return probes * gallery.search_scale
+
+
+def _squared_distances(probes, gallery):
+    if not gallery.is_quantized:
+        sq_distances = probes @ gallery.embeddings.T
+    else:
+        scaled = _scaled_probes(probes, gallery)
+        sq_distances = np.empty((len(probes), len(gallery)), dtype=np.float32)
+        for start in range(0, len(gallery), SCORE_CHUNK_SIZE):
+            block = gallery.search_embeddings[start:start+SCORE_CHUNK_SIZE].astype(np.float32)
+            sq_distances[:, start:start+SCORE_CHUNK_SIZE] = scaled @ block.T
+    sq_distances *= -2.0
+    sq_distances += gallery.search_sq_norms
+    sq_distances += np.einsum('ij,ij->i', probes, probes)[:, None]
+    np.maximum(sq_distances, 0.0, out=sq_distances)
+    if gallery.rerank > 0:
+        all_rows = np.arange(len(gallery))
+        for probe, row_distances in zip(probes, sq_distances):
+            _rerank(probe, all_rows, row_distances, gallery)
+    return sq_distances
+
+
+def _rerank(probe, rows, sq_distances, gallery):
+    n = min(gallery.rerank, len(rows))
+    top = np.argpartition(sq_distances, n - 1)[:n] if n < len(rows) else np.arange(n)
+    top_rows = rows[top]
+    exact = gallery.sq_norms[top_rows] - 2.0 * (gallery.embeddings[top_rows] @ probe) + probe @ probe
+    sq_distances[top] = np.maximum(exact, 0.0)
+
+
+def _add_stats(stats, comparisons, exhaustive):
+    if stats is not None:
+        stats['comparisons'] = stats.get('comparisons', 0) + comparisons
+        stats['exhaustive'] = stats.get('exhaustive', 0) + exhaustive
+
+
+def _exact_rank(probes, gallery, top_k):
+    sq_distances = _squared_distances(probes, gallery)
+    if not top_k:
+        best_rows = np.argmin(sq_distances, axis=1)
+        best = sq_distances[np.arange(len(probes)), best_rows]
+        return [[(gallery.labels[row], float(np.sqrt(sq)))] for row, sq in zip(best_rows, best)]
+    per_identity = np.minimum.reduceat(sq_distances, gallery.offsets[:-1], axis=1)
+    k = min(top_k, per_identity.shape[1])
+    if k < per_identity.shape[1]:
+        candidates = np.argpartition(per_identity, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(k), (len(per_identity), 1))
+    ranked = []
+    for row, identity_ids in enumerate(candidates):
+        scores = per_identity[row, identity_ids]
+        ranked.append([(identity_ids[i], float(np.sqrt(scores[i]))) for i in np.argsort(scores)])
+    return ranked
+
+
+def _rank_candidates(probe, rows, gallery, top_k):
+    if len(rows) == 0:
+        return []
+    block = gallery.search_embeddings[rows]
+    if gallery.is_quantized:
+        block = block.astype(np.float32)
+    scaled = _scaled_probes(probe, gallery)
+    sq_distances = gallery.search_sq_norms[rows] - 2.0 * (block @ scaled) + probe @ probe
+    np.maximum(sq_distances, 0.0, out=sq_distances)
+    if gallery.rerank > 0:
+        _rerank(probe, rows, sq_distances, gallery)
+    labels = gallery.labels[rows]
+    if not top_k:
+        best = np.argmin(sq_distances)
+        return [(labels[best], float(np.sqrt(sq_distances[best])))]
+    order = np.argsort(sq_distances)
+    _, first = np.unique(labels[order], return_index=True)
+    return [(labels[order[i]], float(np.sqrt(sq_distances[order[i]]))) for i in np.sort(first)[:top_k]]
+
+
+def _identity_rows(gallery, identity_ids):
+    starts = gallery.offsets[identity_ids]
+    lengths = gallery.offsets[identity_ids + 1] - starts
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return shifts + np.arange(int(lengths.sum()))
+
+
+def _identity_lower_bounds(probes, gallery):
+    prototype_sq = gallery.prototype_sq_norms - 2.0 * (probes @ gallery.prototypes.T)
+    prototype_sq += np.einsum('ij,ij->i', probes, probes)[:, None]
+    lower_bounds = np.sqrt(np.maximum(prototype_sq, 0.0)) - gallery.prototype_radii - 1e-4
+    return np.minimum.reduceat(lower_bounds, gallery.prototype_offsets[:-1], axis=1)
+
+
+def _prefilter_rank(probe, identity_bounds, gallery, top_k, stats):
+    k = top_k or 1
+    order = np.argsort(identity_bounds)
+    sorted_bounds = identity_bounds[order]
+    comparisons = len(gallery.prototypes)
+    batch_end = min(len(order), max(k, PREFILTER_TOP_IDENTITIES))
+    rows = _identity_rows(gallery, order[:batch_end])
+    if comparisons + len(rows) < len(gallery):
+        matches = _rank_candidates(probe, rows, gallery, k)
+        kth_distance = matches[k-1][1] if len(matches) >= k else np.inf
+        if batch_end == len(order) or sorted_bounds[batch_end] >= kth_distance:
+            _add_stats(stats, comparisons + len(rows), len(gallery))
+            return matches[:k]
+    # The closest identities did not rule out the rest: the caller runs one exact scan instead,
+    # which is cheaper than widening the search identity by identity. It counts as exhaustive.
+    _add_stats(stats, len(gallery), len(gallery))
+    return None
+
+
+def _collect_ranked(ranked, gallery, threshold, top_k):
+    folder_names = []
+    distances = np.full(len(ranked), np.inf, dtype=np.float32)
+    top_matches = [] if top_k else None
+    for i, matches in enumerate(ranked):
+        matches = [(str(gallery.identity_names[label]), dist) for label, dist in matches]
+        if matches:
+            distances[i] = matches[0][1]
+        folder_names.append(matches[0][0] if matches and matches[0][1] < threshold else None)
+        if top_k:
+            top_matches.append(matches)
+    return folder_names, distances, top_matches
+
+
+def find_best_matches(embeddings, gallery, threshold=None, top_k=None, stats=None, n_probe=None):
+    if threshold is None:
+        threshold = RECOGNITION_THRESHOLD
+    if n_probe is None:
+        n_probe = IVF_PROBES
+    probes = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if len(probes) == 0 or gallery is None or len(gallery) == 0:
+        top_matches = [[] for _ in range(len(probes))] if top_k else None
+        return [None] * len(probes), np.full(len(probes), np.inf, dtype=np.float32), top_matches
+    if MATCH_INDEX == "prefilter" and gallery.prototypes is not None and \
+            len(gallery.prototypes) <= PREFILTER_MAX_PROTOTYPE_FRACTION * len(gallery):
+        bounds = _identity_lower_bounds(probes, gallery)
+        ranked = [_prefilter_rank(probe, row, gallery, top_k, stats) for probe, row in zip(probes, bounds)]
+        fallback = [i for i, matches in enumerate(ranked) if matches is None]
+        if fallback:
+            for i, matches in zip(fallback, _exact_rank(probes[fallback], gallery, top_k)):
+                ranked[i] = matches
+    elif gallery.index is not None and n_probe < gallery.index.n_lists:
+        ranked = []
+        for probe in probes:
+            rows = gallery.index.candidates(probe, n_probe)
+            ranked.append(_rank_candidates(probe, rows, gallery, top_k))
+            _add_stats(stats, gallery.index.n_lists + len(rows), len(gallery))
+    else:
+        ranked = _exact_rank(probes, gallery, top_k)
+        _add_stats(stats, len(probes) * len(gallery), len(probes) * len(gallery))
+    return _collect_ranked(ranked, gallery, threshold, top_k)
 
 
 def find_best_match(embedding, known_embeddings, known_folder_names, threshold=None):
@@ -0,0 +1,77 @@
+import time
+import threading
+from datetime import datetime
+from config import GALLERY_RELOAD_INTERVAL
+from face_utils import list_encoding_files, load_gallery, _source_signature
+
+
+def trained_model_signature():
+    signature = []
+    for person_folder, encodings_file in list_encoding_files():
+        try:
+            signature.append((person_folder, tuple(_source_signature(encodings_file))))
+        except OSError:
+            signature.append((person_folder, None))
+    return tuple(signature)
+
+
+class GalleryWatcher:
+    def __init__(self, gallery, interval=None):
+        self.gallery = gallery
+        self.interval = GALLERY_RELOAD_INTERVAL if interval is None else interval
+        self.version = 1
+        self.reload_ms = None
+        self.reloaded_at = datetime.now().strftime("%H:%M:%S")
+        self._signature = trained_model_signature()
+        self._pending = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="GalleryWatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def status_text(self):
+        text = f"Gallery v{self.version} ({len(self.gallery.person_info)} people)"
+        if self.reload_ms is not None:
+            text += f" reloaded {self.reloaded_at} in {self.reload_ms:.0f} ms"
+        return text
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                signature = trained_model_signature()
+            except OSError:
+                continue
+            if signature == self._signature:
+                self._pending = None
+                continue
+            # Training writes several files; wait until the folder is unchanged for one interval.
+            if signature != self._pending:
+                self._pending = signature
+                continue
+            self._reload(signature)
+
+    def _reload(self, signature):
+        start = time.perf_counter()
+        try:
+            gallery = load_gallery()
+        except Exception as e:
+            print(f"Gallery reload failed, keeping version {self.version}: {e}")
+            gallery = None
+        self._signature = signature
+        self._pending = None
+        if gallery is None:
+            return
+        self.gallery = gallery
+        self.reload_ms = (time.perf_counter() - start) * 1000.0
+        self.reloaded_at = datetime.now().strftime("%H:%M:%S")
+        self.version += 1
+        print(f"Gallery reloaded: version {self.version}, {len(gallery.person_info)} people in {self.reload_ms:.0f} ms")
@@ -3,7 +3,22 @@ from tkinter import messagebox, font as tkfont, filedialog, scrolledtext
 import subprocess
 import os
 import sys
-from config import TRAINED_MODEL_DIR
+import time
+from config import TRAINED_MODEL_DIR, AUGMENTATIONS
+from recognition_daemon import DaemonClient
+
+TRAINING_RESULTS = {
+    'train': ("Model trained successfully!\nYou can now start live recognition.", "Model trained successfully!", "Training failed"),
+    'train_enhanced': (f"Enhanced training completed!\n{len(AUGMENTATIONS)}x more training data created.\nBetter accuracy with augmentation!",
+                       f"Enhanced training successful! ({len(AUGMENTATIONS)}x augmentation applied)", "Enhanced training failed"),
+}
+# Scripts that run each daemon job kind as a separate process when the worker is unavailable.
+JOB_SCRIPTS = {
+    'live': "live_recognition.py",
+    'video': "video_recognition.py",
+    'image': "image_recognition.py",
+    'diagnostic': "diagnostic_tool.py",
+}
 
 class FaceRecognitionGUI(tk.Tk):
     def __init__(self):
@@ -15,6 +30,16 @@ class FaceRecognitionGUI(tk.Tk):
         self.title_font = tkfont.Font(family='Helvetica', size=18, weight="bold")
         self.button_font = tkfont.Font(family='Helvetica', size=12)
         self.create_widgets()
+        # One long-lived worker keeps TensorFlow, MTCNN, FaceNet and the gallery loaded for every button.
+        # If it cannot start or dies, the buttons fall back to starting a separate script each time.
+        self.jobs = {}
+        self.worker_ready = False
+        try:
+            self.daemon = DaemonClient(os.path.dirname(os.path.abspath(__file__))).start()
+        except Exception as e:
+            print(f"Could not start recognition worker: {e}")
+            self.daemon = None
+        self.after(100, self._poll_daemon)
 
     def create_widgets(self):
         title_label = tk.Label(
@@ -141,6 +166,8 @@ class FaceRecognitionGUI(tk.Tk):
         exit_btn.pack(pady=10)
 
     def train_model(self):
+        if self._submit_job('train', "Training"):
+            return
         self.status_label.config(text="Training in progress... Please wait.", fg="orange")
         self.update()
         try:
@@ -163,7 +190,9 @@ class FaceRecognitionGUI(tk.Tk):
             self.status_label.config(text="Error occurred during training.", fg="red")
 
     def train_model_enhanced(self):
-        self.status_label.config(text="Enhanced training in progress... (6x data augmentation)", fg="orange")
+        if self._submit_job('train_enhanced', "Enhanced training"):
+            return
+        self.status_label.config(text=f"Enhanced training in progress... ({len(AUGMENTATIONS)}x data augmentation)", fg="orange")
         self.update()
         try:
             python_exe = sys.executable
@@ -175,8 +204,9 @@ class FaceRecognitionGUI(tk.Tk):
                 cwd=os.path.dirname(__file__)
             )
             if result.returncode == 0:
-                messagebox.showinfo("Success", "Enhanced training completed!\n6x more training data created.\nBetter accuracy with augmentation!")
-                self.status_label.config(text="Enhanced training successful! (6x augmentation applied)", fg="green")
+                success_message, success_status, _ = TRAINING_RESULTS['train_enhanced']
+                messagebox.showinfo("Success", success_message)
+                self.status_label.config(text=success_status, fg="green")
             else:
                 messagebox.showerror("Error", f"Enhanced training failed:\n{result.stderr}")
                 self.status_label.config(text="Enhanced training failed.", fg="red")
@@ -187,6 +217,8 @@ class FaceRecognitionGUI(tk.Tk):
     def start_live_recognition(self):
         if not self._check_models_exist():
             return
+        if self._submit_job('live', "Live recognition"):
+            return
         self.status_label.config(text="Starting live recognition...", fg="blue")
         self.update()
         try:
@@ -213,6 +245,8 @@ class FaceRecognitionGUI(tk.Tk):
         )
         if not video_path:
             return
+        if self._submit_job('video', f"Video recognition ({os.path.basename(video_path)})", path=video_path):
+            return
         self.status_label.config(text=f"Processing video: {os.path.basename(video_path)}...", fg="blue")
         self.update()
         try:
@@ -242,6 +276,8 @@ class FaceRecognitionGUI(tk.Tk):
         )
         if not image_path:
             return
+        if self._submit_job('image', f"Image recognition ({os.path.basename(image_path)})", path=image_path):
+            return
         self.status_label.config(text=f"Processing image: {os.path.basename(image_path)}...", fg="blue")
         self.update()
         try:
@@ -287,6 +323,8 @@ class FaceRecognitionGUI(tk.Tk):
     def start_diagnostic(self):
         if not self._check_models_exist():
             return
+        if self._submit_job('diagnostic', "Diagnostic mode"):
+            return
         self.status_label.config(text="Starting diagnostic mode...", fg="blue")
         self.update()
         try:
@@ -301,6 +339,97 @@ class FaceRecognitionGUI(tk.Tk):
             messagebox.showerror("Error", f"Failed to start diagnostic:\n{str(e)}")
             self.status_label.config(text="Failed to start diagnostic.", fg="red")
 
+    def _submit_job(self, kind, label, **params):
+        if self.daemon is None:
+            return False
+        job_id = self.daemon.submit(kind, **params)
+        if job_id is None:
+            return False
+        if self.jobs:
+            text = f"{label} queued; it starts when the current job finishes."
+        elif not self.daemon.ready:
+            text = f"{label} will start once the recognition models have loaded..."
+        else:
+            text = f"Starting {label.lower()}..."
+        self.jobs[job_id] = (kind, label, time.perf_counter(), params)
+        self.status_label.config(text=text, fg="orange" if kind.startswith('train') else "blue")
+        return True
+
+    def _poll_daemon(self):
+        if self.daemon is not None:
+            while not self.daemon.events.empty():
+                self._handle_daemon_event(self.daemon.events.get())
+        self.after(100, self._poll_daemon)
+
+    def _handle_daemon_event(self, event):
+        kind = event['event']
+        if kind == 'loading':
+            self.status_label.config(text="Loading recognition models in the background...", fg="#666666")
+        elif kind == 'ready':
+            self.worker_ready = True
+            if not self.jobs:
+                self.status_label.config(text=f"Ready (models loaded in {event['load_seconds']:.1f}s)", fg="#666666")
+        elif kind in ('failed', 'exit'):
+            if kind == 'failed':
+                print(f"Recognition worker failed to load models: {event['error']}")
+            self.daemon = None
+            self._rerun_queued_jobs(interrupted=self.worker_ready)
+        elif event.get('job') in self.jobs:
+            job_kind, label, submitted, _ = self.jobs[event['job']]
+            if kind == 'output':
+                self.status_label.config(text=f"{label}: {event['text'][:90]}")
+            elif kind == 'first_frame':
+                self.status_label.config(
+                    text=f"{label} running - first frame after {time.perf_counter() - submitted:.2f}s. Press 'q' in the window to quit.",
+                    fg="green")
+            elif kind == 'done':
+                del self.jobs[event['job']]
+                self._finish_job(job_kind, label, event)
+
+    def _rerun_queued_jobs(self, interrupted):
+        # The worker runs jobs one at a time in submission order once its models are loaded, so only
+        # the first job can have started; the ones queued behind it run as separate processes instead.
+        jobs = list(self.jobs.values())
+        self.jobs.clear()
+        if interrupted and jobs:
+            _, label, _, _ = jobs.pop(0)
+            messagebox.showerror("Error", f"{label} was interrupted because the recognition worker stopped.")
+        self.status_label.config(text="Recognition worker stopped; each button will start its own process.", fg="red")
+        for kind, label, _, params in jobs:
+            print(f"Re-running queued job in its own process: {label}")
+            if kind == 'train':
+                self.train_model()
+            elif kind == 'train_enhanced':
+                self.train_model_enhanced()
+            else:
+                self._start_process(kind, label, params.get('path'))
+
+    def _start_process(self, kind, label, path=None):
+        args = [sys.executable, os.path.join(os.path.dirname(__file__), JOB_SCRIPTS[kind])]
+        if path:
+            args.append(path)
+        try:
+            subprocess.Popen(args, cwd=os.path.dirname(__file__))
+            self.status_label.config(text=f"{label} started in its own process. Press 'q' in the window to quit.", fg="green")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to start {label.lower()}:\n{str(e)}")
+            self.status_label.config(text=f"Failed to start {label.lower()}.", fg="red")
+
+    def _finish_job(self, kind, label, event):
+        if kind in TRAINING_RESULTS:
+            success_message, success_status, failure_title = TRAINING_RESULTS[kind]
+            if event['ok']:
+                messagebox.showinfo("Success", success_message)
+                self.status_label.config(text=f"{success_status} ({event['seconds']:.1f}s)", fg="green")
+            else:
+                messagebox.showerror("Error", f"{failure_title}:\n{event['error']}")
+                self.status_label.config(text=f"{failure_title}. Check console for details.", fg="red")
+        elif event['ok']:
+            self.status_label.config(text=f"{label} finished after {event['seconds']:.1f}s.", fg="green")
+        else:
+            messagebox.showerror("Error", f"{label} failed:\n{event['error']}")
+            self.status_label.config(text=f"{label} failed.", fg="red")
+
     def _check_models_exist(self):
         if not os.path.exists(TRAINED_MODEL_DIR):
             messagebox.showwarning(
@@ -326,6 +455,8 @@ class FaceRecognitionGUI(tk.Tk):
 
     def quit_app(self):
         if messagebox.askokcancel("Quit", "Are you sure you want to exit?"):
+            if self.daemon is not None:
+                self.daemon.stop()
             self.destroy()
 
 
@@ -0,0 +1,164 @@
+import time
+import cv2
+import numpy as np
+from datetime import datetime
+
+TOP_BAR_HEIGHT = 40
+INFO_PANEL_WIDTH = 320
+INFO_PANEL_HEIGHT = 75
+ACCENT_COLOR = (0, 255, 200)
+
+
+class OverlayLayer:
+    """Pre-rendered pixels for one region of the frame, applied as  frame * gain + offset."""
+
+    def __init__(self, frame_shape, x0, y0, x1, y1):
+        frame_height, frame_width = frame_shape[:2]
+        self.x0, self.y0 = max(0, x0), max(0, y0)
+        self.x1, self.y1 = min(frame_width, x1), min(frame_height, y1)
+        height, width = max(0, self.y1 - self.y0), max(0, self.x1 - self.x0)
+        # sprite holds the drawn colours over black (premultiplied by coverage),
+        # tint the opacity of the translucent background fill.
+        self.sprite = np.zeros((height, width, 3), np.uint8)
+        self.coverage = np.zeros((height, width), np.uint8)
+        self.tint = np.zeros((height, width), np.float32)
+        self.tint_color = np.zeros(3, np.float32)
+        self.gain = None
+        self.offset = None
+        self._base = None
+        self._buffer = np.empty((height, width, 3), np.float32)
+
+    def _local(self, point):
+        return (int(point[0]) - self.x0, int(point[1]) - self.y0)
+
+    def fill(self, pt1, pt2, color, alpha):
+        cv2.rectangle(self.tint, self._local(pt1), self._local(pt2), alpha, -1)
+        self.tint_color = np.array(color, np.float32)
+
+    def rectangle(self, pt1, pt2, color, thickness):
+        cv2.rectangle(self.sprite, self._local(pt1), self._local(pt2), color, thickness)
+        cv2.rectangle(self.coverage, self._local(pt1), self._local(pt2), 255, thickness)
+
+    def line(self, pt1, pt2, color, thickness):
+        cv2.line(self.sprite, self._local(pt1), self._local(pt2), color, thickness)
+        cv2.line(self.coverage, self._local(pt1), self._local(pt2), 255, thickness)
+
+    def circle(self, center, radius, color):
+        cv2.circle(self.sprite, self._local(center), radius, color, -1)
+        cv2.circle(self.coverage, self._local(center), radius, 255, -1)
+
+    def text(self, text, origin, font, scale, color, thickness=1):
+        cv2.putText(self.sprite, text, self._local(origin), font, scale, color, thickness, cv2.LINE_AA)
+        cv2.putText(self.coverage, text, self._local(origin), font, scale, 255, thickness, cv2.LINE_AA)
+
+    def freeze(self):
+        """Remember what has been drawn so far; reset() returns to it before redrawing dynamic text."""
+        self._base = (self.sprite.copy(), self.coverage.copy())
+        return self
+
+    def reset(self):
+        np.copyto(self.sprite, self._base[0])
+        np.copyto(self.coverage, self._base[1])
+
+    def compile(self):
+        alpha = self.coverage.astype(np.float32)[..., None] / 255.0
+        tint = self.tint[..., None]
+        self.gain = (1.0 - tint) * (1.0 - alpha)
+        # +0.5 so the float -> uint8 cast in apply() rounds instead of truncating.
+        self.offset = tint * self.tint_color * (1.0 - alpha) + self.sprite.astype(np.float32) + 0.5
+        return self
+
+    def apply(self, frame):
+        if self.gain is None or not self.gain.size:
+            return
+        roi = frame[self.y0:self.y1, self.x0:self.x1]
+        np.multiply(roi, self.gain, out=self._buffer)
+        self._buffer += self.offset
+        np.copyto(roi, self._buffer, casting='unsafe')
+
+
+class HudRenderer:
+    """Draws the live recognition HUD, re-rendering cached layers only when their text changes."""
+
+    def __init__(self):
+        self._frame_shape = None
+        self._top_bar = None
+        self._top_bar_status = None
+        self._panel = None
+        self._panel_gps = None
+        self._panel_clock = None
+        self._clock_origin = None
+        self._clock_second = None
+        self.clock_text = ""
+
+    def clock(self):
+        second = int(time.time())
+        if second != self._clock_second:
+            self._clock_second = second
+            self.clock_text = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self.clock_text
+
+    def _build_top_bar(self, frame_shape, status_text):
+        frame_width = frame_shape[1]
+        layer = OverlayLayer(frame_shape, 0, 0, frame_width, TOP_BAR_HEIGHT + 1)
+        layer.fill((0, 0), (frame_width, TOP_BAR_HEIGHT), (15, 15, 15), 0.7)
+        layer.line((0, TOP_BAR_HEIGHT - 1), (frame_width, TOP_BAR_HEIGHT - 1), ACCENT_COLOR, 2)
+        layer.circle((15, 20), 6, ACCENT_COLOR)
+        layer.text("LIVE", (28, 27), cv2.FONT_HERSHEY_DUPLEX, 0.5, ACCENT_COLOR)
+        layer.text(status_text, (80, 27), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (200, 200, 200))
+        screenshot_text = "Press 'S' to Capture"
+        text_size = cv2.getTextSize(screenshot_text, cv2.FONT_HERSHEY_SIMPLEX, 0.45, 1)[0]
+        layer.text(screenshot_text, (frame_width - text_size[0] - 15, 27), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (100, 200, 255))
+        return layer.compile()
+
+    def _build_panel(self, frame_shape, gps_text):
+        frame_height, frame_width = frame_shape[:2]
+        panel_x = frame_width - INFO_PANEL_WIDTH - 10
+        panel_y = frame_height - INFO_PANEL_HEIGHT - 10
+        right, bottom = frame_width - 10, frame_height - 10
+        # The 2 px border is centred on the panel edge, so the layer reaches one pixel past it.
+        layer = OverlayLayer(frame_shape, panel_x - 1, panel_y - 1, right + 2, bottom + 2)
+        layer.fill((panel_x, panel_y), (right, bottom), (20, 20, 20), 0.75)
+        layer.rectangle((panel_x, panel_y), (right, bottom), (0, 200, 255), 2)
+        layer.line((panel_x, panel_y+30), (right, panel_y+30), (40, 40, 40), 1)
+        layer.circle((panel_x + 15, panel_y + 15), 4, (100, 200, 255))
+        layer.text("GPS", (panel_x + 25, panel_y + 20), cv2.FONT_HERSHEY_DUPLEX, 0.4, (100, 200, 255))
+        layer.text(gps_text.replace("GPS: ", ""), (panel_x + 15, panel_y + 48), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200))
+        layer.circle((panel_x + 15, panel_y + 58), 4, (255, 150, 100))
+        layer.text("TIME", (panel_x + 25, panel_y + 63), cv2.FONT_HERSHEY_DUPLEX, 0.4, (255, 150, 100))
+        self._clock_origin = (panel_x + 70, panel_y + 63)
+        return layer.freeze()
+
+    def _update_layers(self, frame_shape, status_text, gps_text):
+        if frame_shape != self._frame_shape:
+            self._frame_shape = frame_shape
+            self._top_bar_status = self._panel_gps = None
+        if status_text != self._top_bar_status:
+            self._top_bar_status = status_text
+            self._top_bar = self._build_top_bar(frame_shape, status_text)
+        if gps_text != self._panel_gps:
+            self._panel_gps = gps_text
+            self._panel = self._build_panel(frame_shape, gps_text)
+            self._panel_clock = None
+        clock_text = self.clock()
+        if clock_text != self._panel_clock:
+            # Once a second: only the clock is redrawn on top of the static panel.
+            self._panel_clock = clock_text
+            self._panel.reset()
+            self._panel.text(clock_text, self._clock_origin, cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200))
+            self._panel.compile()
+
+    def render(self, frame, status_text, gps_text, info_lines=(), flash_text=None):
+        self._update_layers(frame.shape, status_text, gps_text)
+        self._top_bar.apply(frame)
+        for i, line in enumerate(info_lines):
+            cv2.putText(frame, line, (10, TOP_BAR_HEIGHT + 20 * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 0.45, ACCENT_COLOR, 1, cv2.LINE_AA)
+        self._panel.apply(frame)
+        if flash_text:
+            # Half-way to white in place: frame * 0.5 + 255 * 0.5, without a full-frame copy.
+            cv2.convertScaleAbs(frame, frame, 0.5, 127.5)
+            frame_height, frame_width = frame.shape[:2]
+            text_size = cv2.getTextSize(flash_text, cv2.FONT_HERSHEY_TRIPLEX, 1.5, 3)[0]
+            text_x = (frame_width - text_size[0]) // 2
+            text_y = (frame_height + text_size[1]) // 2
+            cv2.putText(frame, flash_text, (text_x, text_y), cv2.FONT_HERSHEY_TRIPLEX, 1.5, (0, 255, 0), 3, cv2.LINE_AA)
@@ -0,0 +1,235 @@
+import cv2
+import numpy as np
+from mtcnn import MTCNN
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+from config import RECOGNITION_THRESHOLD, EMBEDDING_BATCH_SIZE, IMAGE_WORKERS, WINDOW_INITIAL_WIDTH, WINDOW_INITIAL_HEIGHT
+from face_utils import load_gallery, detect_faces, crop_faces, find_best_matches
+from face_tracker import face_identity
+from compiled_embedder import load_embedder, print_embedder_summary
+from video_recognition import draw_faces
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+CSV_FIELDS = ['image', 'x', 'y', 'w', 'h', 'folder', 'name', 'age', 'distance']
+
+
+def list_images(paths):
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                images.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            images.append(path)
+    return images
+
+
+def detect_image(image_path, detector):
+    start = time.perf_counter()
+    image = cv2.imread(image_path)
+    decoded = time.perf_counter()
+    if image is None:
+        return image_path, None, [], [], {'decode': decoded - start, 'detect': 0.0}
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    boxes, faces = crop_faces(rgb_image, detect_faces(detector, rgb_image))
+    return image_path, image.shape[:2], boxes, faces, {'decode': decoded - start, 'detect': time.perf_counter() - decoded}
+
+
+_worker_detector = None
+
+
+def _init_worker():
+    global _worker_detector
+    _worker_detector = MTCNN()
+
+
+def detect_image_safely(image_path, detector):
+    try:
+        return detect_image(image_path, detector)
+    except Exception as e:
+        print(f"Warning: {image_path} failed: {e}")
+        return image_path, None, [], [], {'decode': 0.0, 'detect': 0.0}
+
+
+def _detect_in_worker(image_path):
+    return detect_image_safely(image_path, _worker_detector)
+
+
+class ImageResultWriter:
+    def __init__(self, path):
+        self.path = path
+        self.format = os.path.splitext(path)[1].lower().lstrip('.')
+        if self.format not in ('json', 'jsonl', 'csv'):
+            self.format = 'json'
+
+    def write(self, records):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8', newline='') as f:
+            if self.format == 'json':
+                json.dump(records, f, indent=2)
+            elif self.format == 'jsonl':
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            else:
+                writer = csv.writer(f)
+                writer.writerow(CSV_FIELDS)
+                for record in records:
+                    for face in record['faces']:
+                        x, y, w, h = face['box']
+                        writer.writerow([record['image'], x, y, w, h, face['folder'] or '', face['name'],
+                                         face['age'], f"{face['distance']:.4f}"])
+        print(f"✓ Wrote results for {len(records)} images to {self.path}")
+
+
+class FaceBatcher:
+    """Collects face crops from many images and identifies them in shared FaceNet and matching calls."""
+
+    def __init__(self, embedder, gallery, batch_size):
+        self.embedder = embedder
+        self.gallery = gallery
+        self.batch_size = batch_size
+        self.pending = []
+        self.seconds = {'embed': 0.0, 'match': 0.0}
+        self.calls = 0
+
+    def add(self, record, box, face):
+        self.pending.append((record, box, face))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        start = time.perf_counter()
+        embeddings = self.embedder.embeddings(np.stack([face for _, _, face in pending]))
+        embedded = time.perf_counter()
+        folder_names, distances, _ = find_best_matches(embeddings, self.gallery, RECOGNITION_THRESHOLD)
+        self.seconds['embed'] += embedded - start
+        self.seconds['match'] += time.perf_counter() - embedded
+        self.calls += 1
+        for (record, box, _), folder_name, distance in zip(pending, folder_names, distances):
+            face = face_identity(folder_name, self.gallery.person_info, distance)
+            face['distance'] = round(face['distance'], 4)
+            record['faces'].append(dict(face, box=[int(v) for v in box]))
+
+
+def show_image(record, on_first_frame=None):
+    image = cv2.imread(record['image'])
+    if image is None:
+        return
+    draw_faces(image, [dict(face, box=tuple(face['box'])) for face in record['faces']])
+    window_name = f"Image Face Recognition - {os.path.basename(record['image'])} (Press Q to close)"
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
+    cv2.resizeWindow(window_name, WINDOW_INITIAL_WIDTH, WINDOW_INITIAL_HEIGHT)
+    cv2.imshow(window_name, image)
+    if on_first_frame is not None:
+        on_first_frame()
+    while cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) >= 1:
+        if cv2.waitKey(50) & 0xFF == ord('q'):
+            break
+    cv2.destroyAllWindows()
+
+
+def print_timings(records, stage_seconds, wall_time, workers):
+    faces = sum(len(record['faces']) for record in records)
+    print(f"Images: {len(records)}, faces: {faces}, wall time: {wall_time:.2f}s, "
+          f"{len(records) / wall_time if wall_time > 0 else 0:.1f} images/sec")
+    where = f"summed across {workers} workers" if workers > 1 else "in the main process"
+    print(f"  decode {stage_seconds['decode']:.2f}s, detect {stage_seconds['detect']:.2f}s ({where}); "
+          f"embed {stage_seconds['embed']:.2f}s, match {stage_seconds['match']:.2f}s")
+
+
+def recognize_images(paths, output=None, show=False, workers=None, batch_size=None,
+                     detector=None, embedder=None, gallery=None, on_first_frame=None):
+    if workers is None:
+        workers = IMAGE_WORKERS
+    image_paths = list_images(paths)
+    if not image_paths:
+        print("Error: No images found.")
+        return None
+    if gallery is None:
+        gallery = load_gallery()
+    if gallery is None:
+        return None
+    workers = min(workers, len(image_paths))
+    pool = None
+    if workers > 1:
+        # Spawned (not forked) workers: this process may already hold an initialized TensorFlow,
+        # which is not fork-safe. Starting them before FaceNet loads overlaps their MTCNN start-up.
+        pool = multiprocessing.get_context('spawn').Pool(workers, initializer=_init_worker)
+    try:
+        if embedder is None:
+            embedder = load_embedder()
+        if detector is None and pool is None:
+            detector = MTCNN()
+    except Exception as e:
+        print(f"Error initializing models: {e}")
+        if pool is not None:
+            pool.terminate()
+        return None
+    batcher = FaceBatcher(embedder, gallery, batch_size or EMBEDDING_BATCH_SIZE)
+    stage_seconds = {'decode': 0.0, 'detect': 0.0}
+    records = []
+    print(f"Recognizing faces in {len(image_paths)} images...")
+    start_time = time.perf_counter()
+    if pool is not None:
+        # Workers decode and detect; crops come back in input order and are embedded here in shared batches.
+        detections = pool.imap(_detect_in_worker, image_paths, chunksize=4)
+    else:
+        detections = (detect_image_safely(image_path, detector) for image_path in image_paths)
+    try:
+        for image_path, shape, boxes, faces, seconds in detections:
+            for stage, value in seconds.items():
+                stage_seconds[stage] += value
+            record = {'image': image_path, 'width': None, 'height': None, 'faces': []}
+            if shape is None:
+                record['error'] = 'unreadable'
+            else:
+                record['height'], record['width'] = int(shape[0]), int(shape[1])
+            records.append(record)
+            for box, face in zip(boxes, faces):
+                batcher.add(record, box, face)
+        batcher.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    wall_time = time.perf_counter() - start_time
+    stage_seconds.update(batcher.seconds)
+    if output:
+        ImageResultWriter(output).write(records)
+    elif not show:
+        for record in records:
+            names = ", ".join(f"{face['name']} ({face['distance']:.2f})" for face in record['faces']) or record.get('error', "no faces")
+            print(f"{record['image']}: {names}")
+    print_timings(records, stage_seconds, wall_time, workers)
+    print(f"FaceNet calls: {batcher.calls} for {sum(len(r['faces']) for r in records)} faces")
+    print_embedder_summary(embedder)
+    if show:
+        for record in records:
+            show_image(record, on_first_frame)
+            on_first_frame = None
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recognize faces in an image or a directory tree of images")
+    parser.add_argument('paths', nargs='+', help="Image files and/or directories (searched recursively)")
+    parser.add_argument('--output', default=None, help="Write results to a .json, .jsonl or .csv file")
+    parser.add_argument('--show', action='store_true',
+                        help="Show each annotated image (default when a single image is given without --output)")
+    parser.add_argument('--workers', type=int, default=IMAGE_WORKERS,
+                        help="Processes that decode images and run face detection (0 or 1 = main process)")
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE, help="Faces per FaceNet call")
+    args = parser.parse_args()
+    single_image = len(args.paths) == 1 and os.path.isfile(args.paths[0])
+    show = args.show or (single_image and args.output is None)
+    recognize_images(args.paths, args.output, show, args.workers, args.batch_size)
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+import subprocess
+import contextlib
+from multiprocessing.connection import Listener, Client
+
+AUTHKEY_ENV = "FACE_RECOGNITION_DAEMON_KEY"
+
+
+class ConnectionOutput:
+    """File-like stdout replacement that forwards each printed line to the GUI as a progress event."""
+
+    def __init__(self, send, job_id, echo):
+        self.send = send
+        self.job_id = job_id
+        self.echo = echo
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        self.echo.write(text)
+        with self._lock:
+            self._buffer += text
+            lines = self._buffer.split("\n")
+            self._buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                self.send({'job': self.job_id, 'event': 'output', 'text': line})
+        return len(text)
+
+    def flush(self):
+        self.echo.flush()
+
+
+class _CurrentStdout:
+    # Logging handlers keep the stream they were given; this one always writes to whatever
+    # sys.stdout is now, so log records reach the GUI while a job's output is redirected.
+    def write(self, text):
+        sys.stdout.write(text)
+
+    def flush(self):
+        sys.stdout.flush()
+
+
+class RecognitionDaemon:
+    def __init__(self, conn):
+        self.conn = conn
+        self.models = None
+        self.gallery = None
+        self.gallery_signature = None
+        self.load_seconds = 0.0
+        self.jobs_run = 0
+        self._send_lock = threading.Lock()
+
+    def send(self, message):
+        # Jobs may print from background threads (e.g. screenshot writes) while the main thread reports progress.
+        with self._send_lock:
+            self.conn.send(message)
+
+    def load(self):
+        start = time.perf_counter()
+        # Importing TensorFlow and building MTCNN/FaceNet is the cold-start cost paid once here.
+        from training_engine import LazyModels
+        self.models = LazyModels()
+        self.models.load()
+        self.current_gallery()
+        self.load_seconds = time.perf_counter() - start
+
+    def current_gallery(self):
+        from face_utils import load_gallery
+        from gallery_watcher import trained_model_signature
+        signature = trained_model_signature()
+        if self.gallery is None or signature != self.gallery_signature:
+            self.gallery = load_gallery() if signature else None
+            self.gallery_signature = signature
+        return self.gallery
+
+    def run_job(self, job, first_frame):
+        kind = job['kind']
+        detector, embedder = self.models.load()
+        if kind in ('train', 'train_enhanced'):
+            if kind == 'train':
+                from train_faces import train
+            else:
+                from train_faces_enhanced import train_enhanced as train
+            if train(job.get('full', False), models=self.models) is None:
+                raise RuntimeError("training did not run")
+            return
+        gallery = self.current_gallery()
+        if gallery is None:
+            raise RuntimeError("no trained gallery found; train the model first")
+        if kind == 'live':
+            from live_recognition import recognize_faces
+            recognize_faces(detector, embedder, gallery, first_frame)
+        elif kind == 'video':
+            from video_recognition import recognize_video
+            recognize_video(job['path'], detector=detector, embedder=embedder, gallery=gallery,
+                            on_first_frame=first_frame)
+        elif kind == 'image':
+            from image_recognition import recognize_images
+            if recognize_images([job['path']], show=True, workers=0, detector=detector, embedder=embedder,
+                                gallery=gallery, on_first_frame=first_frame) is None:
+                raise RuntimeError("image recognition did not run")
+        elif kind == 'diagnostic':
+            from diagnostic_tool import diagnose_recognition
+            diagnose_recognition(detector, embedder, gallery, first_frame)
+        else:
+            raise ValueError(f"unknown job kind: {kind}")
+
+    def handle(self, job):
+        job_id = job['id']
+        started = time.perf_counter()
+        self.send({'job': job_id, 'event': 'started', 'warm': self.jobs_run > 0})
+        first_frame = lambda: self.send({'job': job_id, 'event': 'first_frame',
+                                         'seconds': time.perf_counter() - started})
+        output = ConnectionOutput(self.send, job_id, sys.__stdout__)
+        error = None
+        try:
+            with contextlib.redirect_stdout(output):
+                self.run_job(job, first_frame)
+        except Exception as e:
+            error = str(e)
+            print(f"Job {job['kind']} failed: {e}", file=sys.stderr)
+        self.jobs_run += 1
+        self.send({'job': job_id, 'event': 'done', 'ok': error is None, 'error': error,
+                   'seconds': time.perf_counter() - started})
+
+    def serve(self):
+        self.send({'event': 'loading'})
+        try:
+            self.load()
+        except Exception as e:
+            self.send({'event': 'failed', 'error': str(e)})
+            return
+        self.send({'event': 'ready', 'load_seconds': self.load_seconds})
+        while True:
+            try:
+                job = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if job.get('kind') == 'shutdown':
+                break
+            self.handle(job)
+
+
+class DaemonClient:
+    """GUI side: starts the daemon, sends it jobs and queues its events for the Tk loop to poll."""
+
+    def __init__(self, script_dir):
+        self.script_dir = script_dir
+        self.authkey = os.urandom(16)
+        self.listener = Listener(('127.0.0.1', 0), authkey=self.authkey)
+        self.events = queue.Queue()
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.pending = []
+        self.next_id = 1
+        self._lock = threading.Lock()
+
+    def start(self):
+        host, port = self.listener.address
+        env = dict(os.environ, **{AUTHKEY_ENV: self.authkey.hex()})
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(self.script_dir, "recognition_daemon.py"), "--connect", f"{host}:{port}"],
+            cwd=self.script_dir, env=env)
+        threading.Thread(target=self._run, name="DaemonClient", daemon=True).start()
+        return self
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _run(self):
+        try:
+            conn = self.listener.accept()
+        except (OSError, EOFError):
+            return
+        with self._lock:
+            self.conn = conn
+            for job in self.pending:
+                conn.send(job)
+            self.pending = []
+        while True:
+            try:
+                event = conn.recv()
+            except (EOFError, OSError):
+                break
+            if event['event'] == 'ready':
+                self.ready = True
+            self.events.put(event)
+        self.ready = False
+        self.conn = None
+        self.events.put({'event': 'exit'})
+
+    def submit(self, kind, **params):
+        if not self.alive:
+            return None
+        with self._lock:
+            job = dict(params, id=self.next_id, kind=kind)
+            self.next_id += 1
+            if self.conn is None:
+                # Not connected yet; sent as soon as the daemon connects.
+                self.pending.append(job)
+            else:
+                try:
+                    self.conn.send(job)
+                except OSError:
+                    return None
+        return job['id']
+
+    def stop(self):
+        if self.alive:
+            with self._lock:
+                if self.conn is not None:
+                    with contextlib.suppress(OSError):
+                        self.conn.send({'kind': 'shutdown'})
+            try:
+                self.process.wait(timeout=2.0)
+            except subprocess.TimeoutExpired:
+                # A job with an open window is still running; it cannot be interrupted cleanly.
+                self.process.terminate()
+        self.listener.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep MTCNN, FaceNet and the gallery loaded and run jobs sent by gui_app.py")
+    parser.add_argument('--connect', required=True, help="host:port of the GUI's job listener")
+    args = parser.parse_args()
+    host, port = args.connect.rsplit(':', 1)
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=_CurrentStdout())
+    with Client((host, int(port)), authkey=authkey) as conn:
+        RecognitionDaemon(conn).serve()
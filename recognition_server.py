@@ -0,0 +1,242 @@
+import cv2
+import numpy as np
+from mtcnn import MTCNN
+from compiled_embedder import load_embedder, print_embedder_summary
+import os
+import time
+import argparse
+import threading
+from config import RECOGNITION_THRESHOLD, EMBEDDING_BATCH_SIZE, SERVER_REPORT_INTERVAL
+from face_utils import load_gallery, detect_faces, crop_faces, find_best_matches
+from face_tracker import face_identity
+from gallery_watcher import GalleryWatcher
+from video_recognition import ResultWriter, draw_faces
+
+
+class StreamSource:
+    def __init__(self, source, pace=True):
+        self.name = source
+        self.is_camera = source.isdigit()
+        self.cap = cv2.VideoCapture(int(source) if self.is_camera else source)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        # Files are read at their native rate so they behave like live sources; URLs and cameras pace themselves.
+        self.pace = pace and not self.is_camera and os.path.isfile(source)
+        self.frame = None
+        self.frame_idx = None
+        self.timestamp = None
+        self.captured = 0
+        self.dropped = 0
+        self.processed = 0
+        self.faces = 0
+        self.running = False
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.running = self.cap.isOpened()
+        self.started_at = time.perf_counter()
+        if self.running:
+            self._thread = threading.Thread(target=self._run, name=f"StreamSource-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            with self._lock:
+                if self.frame is not None:
+                    # The scheduler never took the previous frame; only the newest one is kept.
+                    self.dropped += 1
+                self.frame = frame
+                self.frame_idx = self.captured
+                self.captured += 1
+                if self.is_camera:
+                    self.timestamp = time.perf_counter() - self.started_at
+                else:
+                    self.timestamp = self.frame_idx / self.fps
+            if self.pace:
+                delay = self.started_at + self.captured / self.fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        self.running = False
+
+    def take(self):
+        with self._lock:
+            frame, self.frame = self.frame, None
+            return self.frame_idx, frame, self.timestamp
+
+    @property
+    def finished(self):
+        return not self.running and self.frame is None
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.cap.release()
+
+
+class BatchScheduler:
+    def __init__(self, streams, detector, embedder, watcher, batch_size=None, threshold=None):
+        self.streams = streams
+        self.detector = detector
+        self.embedder = embedder
+        self.watcher = watcher
+        self.batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        self.threshold = RECOGNITION_THRESHOLD if threshold is None else threshold
+        self.next_stream = 0
+        self.rounds = 0
+        self.embed_calls = 0
+        self.faces = 0
+        self.frames = 0
+        self.seconds = {'detect': 0.0, 'embed': 0.0, 'match': 0.0}
+
+    def step(self):
+        # Each round takes at most one (the newest) frame per stream, starting one stream later every
+        # round, so a busy stream can neither starve the others nor always be served first.
+        order = self.streams[self.next_stream:] + self.streams[:self.next_stream]
+        self.next_stream = (self.next_stream + 1) % len(self.streams)
+        jobs = []
+        crops = []
+        start = time.perf_counter()
+        for stream in order:
+            frame_idx, frame, timestamp = stream.take()
+            if frame is None:
+                continue
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            try:
+                boxes, faces = crop_faces(rgb_frame, detect_faces(self.detector, rgb_frame))
+            except Exception as e:
+                print(f"Warning: detection failed on {stream.name} frame {frame_idx}: {e}")
+                boxes, faces = [], []
+            jobs.append((stream, frame_idx, timestamp, frame, boxes))
+            crops.extend(faces)
+        if not jobs:
+            return []
+        self.seconds['detect'] += time.perf_counter() - start
+        # One gallery for the whole round, even if the watcher swaps in a reloaded one meanwhile.
+        gallery = self.watcher.gallery
+        folder_names, distances = self._identify(crops, gallery)
+        results = []
+        offset = 0
+        for stream, frame_idx, timestamp, frame, boxes in jobs:
+            faces = [dict(face_identity(folder_names[offset + i], gallery.person_info,
+                                        distances[offset + i]), box=tuple(int(v) for v in box))
+                     for i, box in enumerate(boxes)]
+            offset += len(boxes)
+            stream.processed += 1
+            stream.faces += len(faces)
+            results.append((stream, frame_idx, timestamp, frame, faces))
+        self.rounds += 1
+        self.frames += len(jobs)
+        self.faces += len(crops)
+        return results
+
+    def _identify(self, crops, gallery):
+        if not crops:
+            return [], []
+        # Crops from every stream in this round share FaceNet calls of up to batch_size faces.
+        start = time.perf_counter()
+        batch = np.stack(crops)
+        embeddings = np.concatenate([self.embedder.embeddings(batch[i:i+self.batch_size])
+                                     for i in range(0, len(batch), self.batch_size)])
+        self.embed_calls += (len(batch) + self.batch_size - 1) // self.batch_size
+        self.seconds['embed'] += time.perf_counter() - start
+        start = time.perf_counter()
+        folder_names, distances, _ = find_best_matches(embeddings, gallery, self.threshold)
+        self.seconds['match'] += time.perf_counter() - start
+        return folder_names, distances
+
+
+def print_report(streams, scheduler, elapsed):
+    elapsed = max(elapsed, 1e-6)
+    print(f"--- {elapsed:.1f}s ---")
+    for stream in streams:
+        print(f"  {stream.name}: captured {stream.captured}, processed {stream.processed} "
+              f"({stream.processed / elapsed:.1f} fps), dropped {stream.dropped}, faces {stream.faces}")
+    mean_batch = scheduler.faces / scheduler.embed_calls if scheduler.embed_calls else 0.0
+    print(f"  overall: {scheduler.frames / elapsed:.1f} frames/sec, {scheduler.faces / elapsed:.1f} faces/sec, "
+          f"{scheduler.embed_calls} FaceNet calls (mean batch {mean_batch:.1f} faces)")
+    busy = sum(scheduler.seconds.values())
+    if busy > 0:
+        print("  time: " + ", ".join(f"{stage} {seconds / busy * 100:.0f}%" for stage, seconds in scheduler.seconds.items()))
+
+
+def serve(sources, output=None, show=False, pace=True, duration=None, batch_size=None, report_interval=None):
+    gallery = load_gallery()
+    if gallery is None:
+        return
+    try:
+        embedder = load_embedder()
+        detector = MTCNN()
+    except Exception as e:
+        print(f"Error initializing models: {e}")
+        return
+    streams = []
+    for source in sources:
+        stream = StreamSource(source, pace)
+        if not stream.cap.isOpened():
+            print(f"Warning: Could not open source: {source}")
+            continue
+        streams.append(stream)
+    if not streams:
+        print("Error: No sources could be opened.")
+        return
+    watcher = GalleryWatcher(gallery).start()
+    scheduler = BatchScheduler(streams, detector, embedder, watcher, batch_size)
+    result_writer = ResultWriter(output, with_stream=True) if output else None
+    report_interval = SERVER_REPORT_INTERVAL if report_interval is None else report_interval
+    print(f"Serving {len(streams)} streams with one shared detector, embedder and gallery. Press Ctrl+C to stop.")
+    for stream in streams:
+        stream.start()
+    start_time = time.perf_counter()
+    last_report = start_time
+    try:
+        while not all(stream.finished for stream in streams):
+            now = time.perf_counter()
+            if duration and now - start_time >= duration:
+                break
+            results = scheduler.step()
+            if not results:
+                time.sleep(0.002)
+            for stream, frame_idx, timestamp, frame, faces in results:
+                if result_writer is not None:
+                    result_writer.write(frame_idx, timestamp, faces, stream=stream.name)
+                if show:
+                    draw_faces(frame, faces)
+                    cv2.imshow(f"Stream: {stream.name}", frame)
+            if show and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            if report_interval and now - last_report >= report_interval:
+                last_report = now
+                print_report(streams, scheduler, now - start_time)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    wall_time = time.perf_counter() - start_time
+    for stream in streams:
+        stream.stop()
+    watcher.stop()
+    if result_writer is not None:
+        result_writer.close()
+    if show:
+        cv2.destroyAllWindows()
+    print_report(streams, scheduler, wall_time)
+    print_embedder_summary(embedder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recognize faces in several streams with one shared set of models")
+    parser.add_argument('sources', nargs='+', help="Camera indices, video files or stream URLs")
+    parser.add_argument('--output', default=None, help="Write per-frame detections of every stream to a .jsonl or .csv file")
+    parser.add_argument('--show', action='store_true', help="Show one window per stream")
+    parser.add_argument('--no-pace', action='store_true',
+                        help="Read video files as fast as they decode instead of at their frame rate")
+    parser.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE, help="Maximum faces per FaceNet call")
+    parser.add_argument('--report-interval', type=float, default=SERVER_REPORT_INTERVAL,
+                        help="Seconds between throughput reports (0 = only at the end)")
+    args = parser.parse_args()
+    serve(args.sources, args.output, args.show, not args.no_pace, args.duration, args.batch_size, args.report_interval)
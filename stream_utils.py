@@ -0,0 +1,167 @@
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import TARGET_DISPLAY_FPS, MAX_IDENTITY_LATENCY_MS
+
+
+class LatestFrameCapture:
+    def __init__(self, cap):
+        self.cap = cap
+        self.frame = None
+        self.frame_id = 0
+        self.timestamp = None
+        self.running = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="LatestFrameCapture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            with self._condition:
+                if not ret:
+                    self.running = False
+                else:
+                    # Only the newest frame is kept; anything not yet consumed is dropped.
+                    self.frame = frame
+                    self.frame_id += 1
+                    self.timestamp = time.perf_counter()
+                self._condition.notify_all()
+
+    def wait_for(self, after_id, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: self.frame_id > after_id or not self.running, timeout)
+            if self.frame_id <= after_id:
+                return after_id, None, None
+            return self.frame_id, self.frame, self.timestamp
+
+    def stop(self):
+        self.running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+
+class InferenceWorker:
+    def __init__(self, capture, process, scheduler=None):
+        self.capture = capture
+        self.process = process
+        self.scheduler = scheduler
+        self.latest = None
+        self.inference_ms = 0.0
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="InferenceWorker", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        last_id = 0
+        while self.running:
+            skip = self.scheduler.interval - 1 if self.scheduler is not None and last_id else 0
+            frame_id, frame, timestamp = self.capture.wait_for(last_id + skip, timeout=0.1)
+            if frame is None:
+                if not self.capture.running:
+                    break
+                continue
+            last_id = frame_id
+            start = time.perf_counter()
+            try:
+                results = self.process(frame, timestamp)
+            except Exception:
+                continue
+            self.inference_ms = (time.perf_counter() - start) * 1000.0
+            self.latest = (frame_id, timestamp, results)
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+
+class RateMeter:
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.value = None
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self.value = value if self.value is None else self.smoothing * self.value + (1.0 - self.smoothing) * value
+        self.total += value
+        self.count += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class DetectionScheduler:
+    def __init__(self, target_fps=None, max_latency_ms=None, max_interval=30):
+        self.target_fps = TARGET_DISPLAY_FPS if target_fps is None else target_fps
+        self.max_latency_ms = MAX_IDENTITY_LATENCY_MS if max_latency_ms is None else max_latency_ms
+        self.max_interval = max_interval
+        self.interval = 1
+        self.costs = {'detect': RateMeter(), 'embed': RateMeter(), 'render': RateMeter()}
+        self.last_run = None
+
+    def record(self, stage, ms):
+        self.costs[stage].add(ms)
+        self._update()
+
+    def cost(self, stage):
+        return self.costs[stage].value or 0.0
+
+    def _update(self):
+        frame_ms = 1000.0 / self.target_fps
+        work_ms = self.cost('detect') + self.cost('embed')
+        spare_ms = frame_ms - self.cost('render')
+        # Spread detection work over enough frames to keep the display at target_fps...
+        if spare_ms <= 0:
+            interval = self.max_interval
+        else:
+            interval = math.ceil(work_ms / spare_ms)
+        # ...but never wait so long that an identity change takes more than max_latency_ms to show.
+        latency_interval = int((self.max_latency_ms - work_ms) // frame_ms)
+        self.interval = max(1, min(interval, latency_interval, self.max_interval))
+
+    def should_run(self, frame_index):
+        if self.last_run is None or frame_index - self.last_run >= self.interval:
+            self.last_run = frame_index
+            return True
+        return False
+
+    def status_text(self):
+        return (f"Detect every {self.interval} frame(s) | detect {self.cost('detect'):.0f} ms, "
+                f"embed {self.cost('embed'):.0f} ms, render {self.cost('render'):.0f} ms")
+
+
+class SideTaskExecutor:
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="SideTask")
+        self._keyed = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, key=None):
+        # A keyed task is not queued again while a previous one with that key is still running.
+        with self._lock:
+            future = self._keyed.get(key)
+            if key is not None and future is not None and not future.done():
+                return future
+            future = self._executor.submit(fn, *args)
+            if key is not None:
+                self._keyed[key] = future
+            return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
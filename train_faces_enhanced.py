@@ -1,35 +1,13 @@
 import os
 import cv2
-import numpy as np
-from mtcnn import MTCNN
-from keras_facenet import FaceNet
+import argparse
 import logging
-from config import FACE_IMAGES_DIR, TRAINED_MODEL_DIR
+from config import FACE_IMAGES_DIR, TRAINED_MODEL_DIR, AUGMENTATIONS
+from training_engine import run_training, print_throughput
+from augmentation import augment_batch, augmentation_key, DESCRIPTIONS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def read_person_info(person_dir, person_folder_name):
-    txt_files = [f for f in os.listdir(person_dir) if f.endswith('.txt')]
-    if not txt_files:
-        return person_folder_name, "N/A"
-    txt_file = os.path.join(person_dir, txt_files[0])
-    try:
-        with open(txt_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        name = "N/A"
-        age = "N/A"
-        for line in lines:
-            line = line.strip()
-            if line.startswith('NAME:'):
-                name = line.split('NAME:')[1].strip()
-            elif line.startswith('AGE:'):
-                age = line.split('AGE:')[1].strip()
-        return name, age
-    except Exception as e:
-        logging.error(f"Error reading info file {txt_file}: {e}")
-        return person_folder_name, "N/A"
-
-
 def augment_image(image):
     augmented_images = []
     augmented_images.append(image)
@@ -52,87 +30,31 @@ def augment_image(image):
 
 #ENHANCED FACE TRAINING MODEL
 
-if __name__ == "__main__":
+def train_enhanced(full=False, batch_size=None, workers=None, models=None):
     if not os.path.exists(FACE_IMAGES_DIR):
         print(f"Error: Image directory not found at {FACE_IMAGES_DIR}")
-        exit(1)
+        return None
     print(f"Scanning {FACE_IMAGES_DIR}...")
     print("\n" + "="*70)
     print("ENHANCED TRAINING MODE - With Data Augmentation")
     print("="*70)
-    print("Each image will be augmented to create 6 variations:")
-    print("  1. Original")
-    print("  2. Horizontal flip")
-    print("  3. Brightened")
-    print("  4. Darkened")
-    print("  5. Rotated +5°")
-    print("  6. Rotated -5°")
+    print(f"Each image will be augmented to create {len(AUGMENTATIONS)} variations:")
+    for i, name in enumerate(AUGMENTATIONS, 1):
+        print(f"  {i}. {DESCRIPTIONS[name]}")
     print("="*70 + "\n")
-    detector = MTCNN()
-    embedder = FaceNet()
-    total_saved = 0
-    total_original_images = 0
-    for person_name in os.listdir(FACE_IMAGES_DIR):
-        person_dir = os.path.join(FACE_IMAGES_DIR, person_name)
-        if not os.path.isdir(person_dir):
-            continue
-        display_name, age = read_person_info(person_dir, person_name)
-        logging.info(f"Processing images for: {display_name} (Age: {age})")
-        person_embeddings = []
-        original_count = 0
-        for filename in os.listdir(person_dir):
-            if not filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                continue
-            image_path = os.path.join(person_dir, filename)
-            try:
-                image = cv2.imread(image_path)
-                if image is None:
-                    logging.warning(f"Could not read image: {image_path}")
-                    continue
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                results = detector.detect_faces(image_rgb)
-                if not results:
-                    logging.warning(f"No face detected in {filename}")
-                    continue
-                x1, y1, width, height = results[0]['box']
-                x1, y1 = abs(x1), abs(y1)
-                x2, y2 = x1 + width, y1 + height
-                face_original = image_rgb[y1:y2, x1:x2]
-                augmented_faces = augment_image(face_original)
-                for aug_idx, face in enumerate(augmented_faces):
-                    try:
-                        face_resized = cv2.resize(face, (160, 160))
-                        face_pixels = np.expand_dims(face_resized, axis=0)
-                        embedding = embedder.embeddings(face_pixels)[0]
-                        person_embeddings.append(embedding)
-                        if aug_idx == 0:
-                            original_count += 1
-                            total_original_images += 1
-                    except Exception as e:
-                        logging.error(f"Error processing augmented image {aug_idx} of {filename}: {e}")
-            except Exception as e:
-                logging.error(f"Error processing {filename}: {e}")
-        if person_embeddings:
-            person_model_dir = os.path.join(TRAINED_MODEL_DIR, person_name)
-            os.makedirs(person_model_dir, exist_ok=True)
-            output_file = os.path.join(person_model_dir, "encodings.npz")
-            np.savez(output_file,
-                    embeddings=np.array(person_embeddings),
-                    folder_name=person_name,
-                    name=display_name,
-                    age=age)
-            print(f"✓ Saved {len(person_embeddings)} embeddings for '{display_name}' (Age: {age})")
-            print(f"  └─ {original_count} original images → {len(person_embeddings)} total embeddings (6x augmentation)")
-            total_saved += len(person_embeddings)
-        else:
-            print(f"✗ No embeddings extracted for '{person_name}'")
+    stats = run_training(f"enhanced-{augmentation_key()}", augment_batch, full=full, batch_size=batch_size, workers=workers, models=models)
+    total_saved = stats['embeddings_saved']
+    total_original_images = stats['images']
     print(f"\n{'='*70}")
     print(f"ENHANCED TRAINING COMPLETE!")
     print(f"{'='*70}")
+    print(f"People updated: {stats['people_written']} (unchanged: {stats['people_unchanged']})")
+    print(f"Images reused from cache: {stats['cached_images']}")
     print(f"Original images processed: {total_original_images}")
     print(f"Total embeddings saved: {total_saved}")
     print(f"Augmentation factor: {total_saved/total_original_images if total_original_images > 0 else 0:.1f}x")
     print(f"Trained models location: {TRAINED_MODEL_DIR}")
+    print_throughput(stats)
     print(f"{'='*70}")
     print("\nBENEFITS OF AUGMENTATION:")
     print("  ✓ More robust recognition in different lighting")
@@ -140,3 +62,14 @@ if __name__ == "__main__":
     print("  ✓ Improved accuracy with limited training images")
     print("  ✓ Reduced overfitting")
     print(f"{'='*70}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train face embeddings with data augmentation")
+    parser.add_argument('--full', action='store_true', help="Ignore the training cache and rebuild every person")
+    parser.add_argument('--batch-size', type=int, default=None, help="FaceNet batch size (default: EMBEDDING_BATCH_SIZE)")
+    parser.add_argument('--workers', type=int, default=None, help="Face detection worker processes (default: TRAINING_WORKERS)")
+    args = parser.parse_args()
+    if train_enhanced(args.full, args.batch_size, args.workers) is None:
+        exit(1)
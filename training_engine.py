@@ -0,0 +1,347 @@
+import os
+import json
+import hashlib
+import time
+import logging
+import cv2
+import numpy as np
+from config import FACE_IMAGES_DIR, TRAINED_MODEL_DIR, TRAINING_CACHE_DIR, EMBEDDING_BATCH_SIZE
+from config import TRAINING_WORKERS, TRAINING_QUEUE_SIZE, QUALITY_REPORT_FILE, QUALITY_SKIP_ISSUES
+from face_utils import build_gallery, gallery_is_stale, list_encoding_files, write_atomic
+from detection_pipeline import detect_faces_in_images
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MANIFEST_FILE = os.path.join(TRAINING_CACHE_DIR, "manifest.json")
+EMBEDDING_CACHE_DIR = os.path.join(TRAINING_CACHE_DIR, "embeddings")
+
+
+def read_person_info(person_dir, person_folder_name):
+    txt_files = [f for f in os.listdir(person_dir) if f.endswith('.txt')]
+    if not txt_files:
+        return person_folder_name, "N/A"
+    txt_file = os.path.join(person_dir, txt_files[0])
+    try:
+        with open(txt_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        name = "N/A"
+        age = "N/A"
+        for line in lines:
+            line = line.strip()
+            if line.startswith('NAME:'):
+                name = line.split('NAME:')[1].strip()
+            elif line.startswith('AGE:'):
+                age = line.split('AGE:')[1].strip()
+        return name, age
+    except Exception as e:
+        logging.error(f"Error reading info file {txt_file}: {e}")
+        return person_folder_name, "N/A"
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def quality_skipped_images():
+    # {relative path: content hash} of images check_image_quality.py flagged with an issue in
+    # QUALITY_SKIP_ISSUES. Matching on both means an image edited since the scan is used again.
+    if not QUALITY_SKIP_ISSUES or not os.path.exists(QUALITY_REPORT_FILE):
+        return {}
+    try:
+        with open(QUALITY_REPORT_FILE, 'r', encoding='utf-8') as f:
+            images = json.load(f)['images']
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"Ignoring unreadable quality report {QUALITY_REPORT_FILE}: {e}")
+        return {}
+    return {rel_path: r['hash'] for rel_path, r in images.items() if set(r.get('issues', ())) & set(QUALITY_SKIP_ISSUES)}
+
+
+class TrainingCache:
+    def __init__(self, mode, full=False):
+        self.mode = mode
+        self.manifest = {'images': {}, 'people': {}}
+        if not full and os.path.exists(MANIFEST_FILE):
+            try:
+                with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable training manifest {MANIFEST_FILE}: {e}")
+        self.seen_images = set()
+        self._hash_index = None
+
+    def _by_hash(self):
+        if self._hash_index is None:
+            self._hash_index = {r['hash']: {'box': r['box'], 'status': r['status']}
+                                for r in self.manifest['images'].values()}
+        return self._hash_index
+
+    def image_record(self, rel_path, image_path):
+        stat = os.stat(image_path)
+        record = self.manifest['images'].get(rel_path)
+        if record is None or record['size'] != stat.st_size or record['mtime_ns'] != stat.st_mtime_ns:
+            content_hash = file_hash(image_path)
+            if record is None or record['hash'] != content_hash:
+                record = dict(self._by_hash().get(content_hash, {'box': None, 'status': None}))
+                record['hash'] = content_hash
+            record['size'] = stat.st_size
+            record['mtime_ns'] = stat.st_mtime_ns
+            self.manifest['images'][rel_path] = record
+        self.seen_images.add(rel_path)
+        return record
+
+    def _embedding_file(self, record):
+        return os.path.join(EMBEDDING_CACHE_DIR, f"{record['hash']}_{self.mode}.npy")
+
+    def get_embeddings(self, record):
+        if record['status'] != 'ok':
+            return None
+        try:
+            return np.load(self._embedding_file(record))
+        except (OSError, ValueError):
+            return None
+
+    def put_embeddings(self, record, embeddings):
+        os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+        write_atomic(self._embedding_file(record), lambda f: np.save(f, embeddings))
+
+    def person_unchanged(self, person_name, signature):
+        return self.manifest['people'].get(person_name) == signature
+
+    def set_person(self, person_name, signature):
+        self.manifest['people'][person_name] = signature
+
+    def prune(self, people):
+        images = self.manifest['images']
+        for rel_path in [p for p in images if p not in self.seen_images]:
+            del images[rel_path]
+        for person_name in [p for p in self.manifest['people'] if p not in people]:
+            del self.manifest['people'][person_name]
+        if not os.path.isdir(EMBEDDING_CACHE_DIR):
+            return
+        live_hashes = {record['hash'] for record in images.values()}
+        for filename in os.listdir(EMBEDDING_CACHE_DIR):
+            if filename.split('_', 1)[0] not in live_hashes:
+                os.remove(os.path.join(EMBEDDING_CACHE_DIR, filename))
+
+    def save(self):
+        os.makedirs(TRAINING_CACHE_DIR, exist_ok=True)
+        write_atomic(MANIFEST_FILE, lambda f: f.write(json.dumps(self.manifest).encode('utf-8')))
+
+
+def resize_variants(faces, filename):
+    if isinstance(faces, np.ndarray) and faces.ndim == 4:
+        return faces
+    resized = []
+    for aug_idx, face in enumerate(faces):
+        try:
+            resized.append(cv2.resize(face, (160, 160)))
+        except Exception as e:
+            logging.error(f"Error processing augmented image {aug_idx} of {filename}: {e}")
+    return resized
+
+
+class LazyModels:
+    def __init__(self):
+        self.detector = None
+        self.embedder = None
+
+    def load(self):
+        if self.embedder is None:
+            from mtcnn import MTCNN
+            from compiled_embedder import load_embedder
+            self.detector = MTCNN()
+            self.embedder = load_embedder()
+        return self.detector, self.embedder
+
+
+class BatchEmbedder:
+    def __init__(self, models, batch_size):
+        self.models = models
+        self.batch_size = batch_size
+        self.pending_keys = []
+        self.pending_faces = []
+        self.results = {}
+        self.embedded = 0
+        self.seconds = 0.0
+
+    def add(self, key, faces):
+        for face in faces:
+            self.pending_keys.append(key)
+            self.pending_faces.append(face)
+            if len(self.pending_faces) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if not self.pending_faces:
+            return
+        keys, faces = self.pending_keys, self.pending_faces
+        self.pending_keys, self.pending_faces = [], []
+        _, embedder = self.models.load()
+        start = time.perf_counter()
+        try:
+            embeddings = embedder.embeddings(np.stack(faces))
+        except Exception as e:
+            logging.error(f"Error embedding batch of {len(faces)} faces: {e}")
+            return
+        self.seconds += time.perf_counter() - start
+        self.embedded += len(faces)
+        for key, embedding in zip(keys, embeddings):
+            self.results.setdefault(key, []).append(embedding)
+
+    def pop(self, key):
+        return self.results.pop(key, None)
+
+
+def remove_encodings(output_file):
+    if not os.path.exists(output_file):
+        return False
+    os.remove(output_file)
+    print(f"✓ Removed stale {output_file}")
+    return True
+
+
+def run_training(mode, make_variants, full=False, batch_size=None, workers=None, queue_size=None, models=None):
+    if batch_size is None:
+        batch_size = EMBEDDING_BATCH_SIZE
+    if workers is None:
+        workers = TRAINING_WORKERS
+    if queue_size is None:
+        queue_size = TRAINING_QUEUE_SIZE
+    start_time = time.perf_counter()
+    cache = TrainingCache(mode, full)
+    if models is None:
+        models = LazyModels()
+    batcher = BatchEmbedder(models, batch_size)
+    stats = {'people_written': 0, 'people_unchanged': 0, 'images': 0, 'cached_images': 0,
+             'embedded_images': 0, 'embeddings_saved': 0, 'quality_skipped': 0}
+    skipped_images = quality_skipped_images()
+    people = []
+    plans = []
+    jobs = []
+    for person_name in sorted(os.listdir(FACE_IMAGES_DIR)):
+        person_dir = os.path.join(FACE_IMAGES_DIR, person_name)
+        if not os.path.isdir(person_dir):
+            continue
+        people.append(person_name)
+        display_name, age = read_person_info(person_dir, person_name)
+        filenames = [f for f in sorted(os.listdir(person_dir)) if f.lower().endswith(IMAGE_EXTENSIONS)]
+        records = [cache.image_record(f"{person_name}/{f}", os.path.join(person_dir, f)) for f in filenames]
+        if skipped_images:
+            kept = [(f, r) for f, r in zip(filenames, records) if skipped_images.get(f"{person_name}/{f}") != r['hash']]
+            stats['quality_skipped'] += len(filenames) - len(kept)
+            filenames, records = [f for f, _ in kept], [r for _, r in kept]
+        signature = [mode, display_name, age, [[f, r['hash']] for f, r in zip(filenames, records)]]
+        output_file = os.path.join(TRAINED_MODEL_DIR, person_name, "encodings.npz")
+        if not full and cache.person_unchanged(person_name, signature) and os.path.exists(output_file):
+            stats['people_unchanged'] += 1
+            continue
+        logging.info(f"Processing images for: {display_name} (Age: {age})")
+        images = []
+        for filename, record in zip(filenames, records):
+            embeddings = cache.get_embeddings(record)
+            if embeddings is not None:
+                stats['cached_images'] += 1
+                images.append((filename, record, embeddings))
+                continue
+            if record['status'] == 'no_face':
+                logging.warning(f"No face detected in {filename} (cached)")
+                continue
+            jobs.append((person_name, filename, os.path.join(person_dir, filename), record))
+            images.append((filename, record, None))
+        plans.append((person_name, display_name, age, signature, output_file, images))
+
+    detections = detect_faces_in_images([(image_path, record['box']) for _, _, image_path, record in jobs],
+                                        models, workers, queue_size)
+    for index, face, box, status, error in detections:
+        person_name, filename, image_path, record = jobs[index]
+        if status == 'error':
+            logging.error(f"Error processing {filename}: {error}")
+            continue
+        if status == 'unreadable':
+            logging.warning(f"Could not read image: {image_path}")
+            continue
+        record['status'] = status
+        if status == 'no_face':
+            logging.warning(f"No face detected in {filename}")
+            continue
+        record['box'] = box
+        try:
+            faces = resize_variants(make_variants(face), filename)
+        except Exception as e:
+            logging.error(f"Error processing {filename}: {e}")
+            continue
+        if len(faces):
+            batcher.add((person_name, filename), faces)
+    batcher.flush()
+
+    for person_name, display_name, age, signature, output_file, images in plans:
+        person_embeddings = []
+        original_count = 0
+        missing = 0
+        for filename, record, embeddings in images:
+            if embeddings is None:
+                embeddings = batcher.pop((person_name, filename))
+                if not embeddings:
+                    # A detected no_face is a final result; anything else (read/detection error,
+                    # failed FaceNet batch) must be retried, so the person is not marked unchanged.
+                    if record['status'] != 'no_face':
+                        missing += 1
+                    continue
+                embeddings = np.array(embeddings)
+                cache.put_embeddings(record, embeddings)
+                stats['embedded_images'] += 1
+            person_embeddings.extend(embeddings)
+            original_count += 1
+        stats['images'] += original_count
+        if missing:
+            logging.warning(f"{missing} images of '{display_name}' were not embedded; they will be retried on the next run")
+        if person_embeddings:
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            np.savez(output_file,
+                    embeddings=np.array(person_embeddings),
+                    folder_name=person_name,
+                    name=display_name,
+                    age=age)
+            if not missing:
+                cache.set_person(person_name, signature)
+            print(f"✓ Saved {len(person_embeddings)} embeddings for '{display_name}' (Age: {age}) to {output_file}")
+            if len(person_embeddings) > original_count:
+                factor = len(person_embeddings) / original_count
+                print(f"  └─ {original_count} original images → {len(person_embeddings)} total embeddings ({factor:.0f}x augmentation)")
+            stats['people_written'] += 1
+            stats['embeddings_saved'] += len(person_embeddings)
+        else:
+            print(f"✗ No embeddings extracted for '{person_name}'")
+            if remove_encodings(output_file):
+                stats['people_written'] += 1
+    for person_name, encodings_file in list_encoding_files():
+        # Trained people whose folder was deleted from FACE_IMAGES must stop being recognized. Found on
+        # disk rather than in the manifest, which is empty on a --full run.
+        if person_name not in people and remove_encodings(encodings_file):
+            stats['people_written'] += 1
+    cache.prune(people)
+    cache.save()
+    if stats['quality_skipped']:
+        print(f"Skipped {stats['quality_skipped']} images flagged by check_image_quality.py ({', '.join(QUALITY_SKIP_ISSUES)})")
+    if stats['people_unchanged']:
+        print(f"Skipped {stats['people_unchanged']} unchanged people (use --full to rebuild everything)")
+    if stats['people_written'] or gallery_is_stale():
+        build_gallery()
+    if models.embedder is not None:
+        from compiled_embedder import print_embedder_summary
+        print_embedder_summary(models.embedder)
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['images_per_sec'] = stats['embedded_images'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+    stats['faces_per_sec'] = batcher.embedded / batcher.seconds if batcher.seconds > 0 else 0.0
+    stats['batch_size'] = batch_size
+    stats['workers'] = workers
+    return stats
+
+
+def print_throughput(stats):
+    print(f"Throughput: {stats['embedded_images']} new images in {stats['seconds']:.1f}s "
+          f"({stats['images_per_sec']:.1f} images/sec), FaceNet {stats['faces_per_sec']:.1f} faces/sec "
+          f"at batch size {stats['batch_size']}, {stats['workers'] if stats['workers'] > 1 else 'no'} detection workers")
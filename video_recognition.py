@@ -1,20 +1,363 @@
 import cv2
 import numpy as np
 from mtcnn import MTCNN
-from keras_facenet import FaceNet
+from compiled_embedder import load_embedder, print_embedder_summary
 import os
-import sys
+import csv
+import json
+import time
+import argparse
+import multiprocessing
 from config import RECOGNITION_THRESHOLD, WINDOW_INITIAL_WIDTH, WINDOW_INITIAL_HEIGHT
-from face_utils import load_embeddings, find_best_match
+from config import VIDEO_WORKERS, VIDEO_SEGMENT_SECONDS, VIDEO_SAMPLE_FPS, SCENE_CHANGE_THRESHOLD
+from face_utils import load_gallery, detect_faces, crop_faces, find_best_matches
+from face_tracker import FaceTracker, identify_tracks, face_identity
+from stream_utils import DetectionScheduler
 
+CSV_FIELDS = ['frame', 'timestamp', 'x', 'y', 'w', 'h', 'folder', 'name', 'age', 'distance', 'track_id']
 
-def recognize_video(video_path):
-    known_embeddings, known_folder_names, person_info = load_embeddings()
-    if known_embeddings is None:
+
+class ResultWriter:
+    def __init__(self, path, with_stream=False):
+        self.path = path
+        self.with_stream = with_stream
+        self.format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.rows = 0
+        if self.format == 'csv':
+            self.csv = csv.writer(self.file)
+            self.csv.writerow((['stream'] if with_stream else []) + CSV_FIELDS)
+
+    def write(self, frame_idx, timestamp, faces, stream=None):
+        timestamp = round(timestamp, 3)
+        prefix = [stream] if self.with_stream else []
+        if self.format == 'jsonl':
+            record = {'stream': stream} if self.with_stream else {}
+            record.update({'frame': frame_idx, 'timestamp': timestamp, 'faces': [
+                {'box': list(face['box']), 'folder': face['folder'], 'name': face['name'], 'age': face['age'],
+                 'distance': None if face['distance'] is None else round(face['distance'], 4),
+                 'track_id': face.get('track_id')}
+                for face in faces]})
+            self.file.write(json.dumps(record) + "\n")
+            self.rows += 1
+            return
+        for face in faces:
+            x, y, w, h = face['box']
+            distance = '' if face['distance'] is None else f"{face['distance']:.4f}"
+            self.csv.writerow(prefix + [frame_idx, timestamp, x, y, w, h, face['folder'] or '', face['name'], face['age'],
+                               distance, face.get('track_id', '')])
+            self.rows += 1
+
+    def close(self):
+        self.file.close()
+        print(f"✓ Wrote {self.rows} {self.format.upper()} rows to {self.path}")
+
+
+def recognize_frame(frame, detector, embedder, gallery):
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    boxes, faces = crop_faces(rgb_frame, detect_faces(detector, rgb_frame))
+    if not faces:
+        return []
+    embeddings = embedder.embeddings(np.stack(faces))
+    folder_names, distances, _ = find_best_matches(embeddings, gallery, RECOGNITION_THRESHOLD)
+    return [dict(face_identity(folder_name, gallery.person_info, distance), box=tuple(int(v) for v in box))
+            for box, folder_name, distance in zip(boxes, folder_names, distances)]
+
+
+def draw_faces(frame, faces):
+    for face_data in faces:
+        x, y, w, h = face_data['box']
+        if face_data['is_known']:
+            color = (0, 0, 255)
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            cv2.putText(frame, face_data['name'], (x, y-30), cv2.FONT_HERSHEY_TRIPLEX, 0.7, color, 2)
+            cv2.putText(frame, f"Age: {face_data['age']}", (x, y-10), cv2.FONT_HERSHEY_TRIPLEX, 0.5, color, 2)
+        else:
+            color = (0, 255, 0)
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            cv2.putText(frame, "Unknown", (x, y-10), cv2.FONT_HERSHEY_TRIPLEX, 0.7, color, 2)
+
+
+def open_video_writer(path, cap, fps):
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        print(f"Warning: Could not open video writer for {path}")
+        return None
+    return writer
+
+
+class FrameSampler:
+    def __init__(self, fps, sample_fps=None, scene_threshold=None):
+        self.fps = fps
+        self.sample_fps = sample_fps if sample_fps and sample_fps < fps else None
+        self.scene_threshold = scene_threshold
+        self.previous = None
+        self.stats = {'decoded': 0, 'grabbed': 0, 'decode_seconds': 0.0, 'grab_seconds': 0.0,
+                      'analyzed': 0, 'scene_skips': 0}
+
+    def wants(self, frame_idx):
+        if self.sample_fps is None:
+            return True
+        # Position based, so every segment of a parallel run picks the same frames as a serial run.
+        period = lambda idx: int(idx * self.sample_fps / self.fps + 1e-9)
+        return frame_idx == 0 or period(frame_idx) != period(frame_idx - 1)
+
+    def next_frame(self, cap, frame_idx, need_pixels=False):
+        start = time.perf_counter()
+        if need_pixels or self.wants(frame_idx):
+            ret, frame = cap.read()
+            self.stats['decode_seconds'] += time.perf_counter() - start
+            self.stats['decoded'] += int(ret)
+            return ret, frame
+        # grab() demuxes and advances without decoding to BGR or colour-converting.
+        ret = cap.grab()
+        self.stats['grab_seconds'] += time.perf_counter() - start
+        self.stats['grabbed'] += int(ret)
+        return ret, None
+
+    def scene_changed(self, frame):
+        if not self.scene_threshold:
+            return True
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+        small = small.astype(np.int16)
+        if self.previous is not None and np.mean(np.abs(small - self.previous)) < self.scene_threshold:
+            self.stats['scene_skips'] += 1
+            return False
+        self.previous = small
+        return True
+
+    def merge(self, stats):
+        for key, value in stats.items():
+            self.stats[key] += value
+
+    def report(self):
+        stats = self.stats
+        if self.sample_fps is not None:
+            print(f"Sampling {self.sample_fps:g} of {self.fps:g} fps: decoded {stats['decoded']} frames, "
+                  f"grabbed {stats['grabbed']} without decoding")
+            if stats['decoded'] and stats['grabbed']:
+                read_ms = stats['decode_seconds'] * 1000.0 / stats['decoded']
+                grab_ms = stats['grab_seconds'] * 1000.0 / stats['grabbed']
+                saved = stats['grabbed'] * (read_ms - grab_ms) / 1000.0
+                print(f"  read {read_ms:.2f} ms/frame vs grab {grab_ms:.2f} ms/frame, "
+                      f"~{saved:.1f}s decode time saved")
+        if self.scene_threshold:
+            print(f"Scene-change gate skipped {stats['scene_skips']} near-identical frames "
+                  f"(analyzed {stats['analyzed']})")
+
+
+def analyze_frame(sampler, frame, frame_idx, detector, embedder, gallery, last_faces):
+    if not sampler.scene_changed(frame):
+        return last_faces
+    sampler.stats['analyzed'] += 1
+    try:
+        return recognize_frame(frame, detector, embedder, gallery)
+    except Exception as e:
+        print(f"Warning: frame {frame_idx} failed: {e}")
+        return []
+
+
+_worker_models = {}
+
+
+def _init_segment_worker():
+    try:
+        _worker_models['gallery'] = load_gallery()
+        _worker_models['embedder'] = load_embedder()
+        _worker_models['detector'] = MTCNN()
+    except Exception as e:
+        print(f"Error initializing models in worker {os.getpid()}: {e}")
+
+
+def seek_to_frame(cap, frame_idx):
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_idx:
+        return True
+    # Some containers can't seek frame-accurately; fall back to grabbing from the start.
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_idx):
+        if not cap.grab():
+            return False
+    return True
+
+
+def process_segment(task):
+    video_path, start_frame, end_frame, fps, sample_fps, scene_threshold = task
+    segment_start = time.perf_counter()
+    gallery = _worker_models.get('gallery')
+    if gallery is None or 'detector' not in _worker_models:
+        raise RuntimeError("worker models failed to load")
+    sampler = FrameSampler(fps, sample_fps, scene_threshold)
+    cap = cv2.VideoCapture(video_path)
+    results = []
+    faces = []
+    if cap.isOpened() and seek_to_frame(cap, start_frame):
+        frame_idx = start_frame
+        while end_frame is None or frame_idx < end_frame:
+            ret, frame = sampler.next_frame(cap, frame_idx)
+            if not ret:
+                break
+            if frame is not None:
+                faces = analyze_frame(sampler, frame, frame_idx, _worker_models['detector'],
+                                      _worker_models['embedder'], gallery, faces)
+                results.append((frame_idx, frame_idx / fps, faces))
+            frame_idx += 1
+    cap.release()
+    return start_frame, results, sampler.stats, time.perf_counter() - segment_start
+
+
+def write_annotated_video(video_path, save_video, frames, fps):
+    cap = cv2.VideoCapture(video_path)
+    video_writer = open_video_writer(save_video, cap, fps)
+    if video_writer is not None:
+        faces_by_frame = {frame_idx: faces for frame_idx, _, faces in frames}
+        faces = []
+        frame_idx = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            faces = faces_by_frame.get(frame_idx, faces)
+            draw_faces(frame, faces)
+            video_writer.write(frame)
+            frame_idx += 1
+        video_writer.release()
+        print(f"✓ Annotated video saved to {save_video}")
+    cap.release()
+
+
+def print_throughput(frame_count, wall_time):
+    print(f"Frames: {frame_count}, wall time: {wall_time:.1f}s, "
+          f"{frame_count / wall_time if wall_time > 0 else 0:.1f} frames/sec")
+
+
+def recognize_video_parallel(video_path, workers, segment_seconds, output=None, save_video=None,
+                             sample_fps=None, scene_threshold=None):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file: {video_path}")
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    segment_frames = max(1, int(round(segment_seconds * fps)))
+    starts = list(range(0, max(total_frames, 1), segment_frames))
+    # The last segment runs to end of stream in case the container's frame count is short.
+    tasks = [(video_path, start, start + segment_frames if i < len(starts) - 1 else None, fps,
+              sample_fps, scene_threshold)
+             for i, start in enumerate(starts)]
+    workers = max(1, min(workers, len(tasks)))
+    print(f"Processing video: {os.path.basename(video_path)}")
+    print(f"Parallel headless mode: {len(tasks)} segments of {segment_seconds:g}s across {workers} worker processes")
+    result_writer = ResultWriter(output) if output else None
+    sampler = FrameSampler(fps, sample_fps, scene_threshold)
+    keep_frames = save_video is not None
+    frames = []
+    segment_seconds_total = 0.0
+    start_time = time.perf_counter()
+    # Spawned (not forked) workers: this process has already imported TensorFlow, which is not fork-safe.
+    with multiprocessing.get_context('spawn').Pool(workers, initializer=_init_segment_worker) as pool:
+        # imap yields segments in submission order, so results are merged in timestamp order.
+        for start_frame, results, stats, seconds in pool.imap(process_segment, tasks):
+            segment_seconds_total += seconds
+            sampler.merge(stats)
+            for frame_idx, timestamp, faces in results:
+                if result_writer is not None:
+                    result_writer.write(frame_idx, timestamp, faces)
+                if keep_frames:
+                    frames.append((frame_idx, timestamp, faces))
+    wall_time = time.perf_counter() - start_time
+    if result_writer is not None:
+        result_writer.close()
+    if keep_frames:
+        write_annotated_video(video_path, save_video, frames, fps)
+    print_throughput(sampler.stats['decoded'] + sampler.stats['grabbed'], wall_time)
+    sampler.report()
+    if wall_time > 0:
+        print(f"Segment processing time {segment_seconds_total:.1f}s across workers, "
+              f"speedup {segment_seconds_total / wall_time:.1f}x over one process (excluding model loading)")
+    print("Video processing complete.")
+
+
+def recognize_video_headless(video_path, output=None, save_video=None, sample_fps=None, scene_threshold=None,
+                             detector=None, embedder=None, gallery=None):
+    if gallery is None:
+        gallery = load_gallery()
+    if gallery is None:
+        return
+    try:
+        if embedder is None:
+            embedder = load_embedder()
+        if detector is None:
+            detector = MTCNN()
+    except Exception as e:
+        print(f"Error initializing models: {e}")
+        return
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file: {video_path}")
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    result_writer = ResultWriter(output) if output else None
+    video_writer = open_video_writer(save_video, cap, fps) if save_video else None
+    sampler = FrameSampler(fps, sample_fps, scene_threshold)
+    print(f"Processing video: {os.path.basename(video_path)}")
+    print("Headless mode: no preview window, processing frames as fast as possible.")
+    frame_idx = 0
+    faces = []
+    start_time = time.perf_counter()
+    while True:
+        # An annotated output video needs every frame decoded, sampled or not.
+        ret, frame = sampler.next_frame(cap, frame_idx, need_pixels=video_writer is not None)
+        if not ret:
+            print("End of video reached.")
+            break
+        if sampler.wants(frame_idx):
+            faces = analyze_frame(sampler, frame, frame_idx, detector, embedder, gallery, faces)
+            if result_writer is not None:
+                result_writer.write(frame_idx, frame_idx / fps, faces)
+        if video_writer is not None:
+            draw_faces(frame, faces)
+            video_writer.write(frame)
+        frame_idx += 1
+    wall_time = time.perf_counter() - start_time
+    cap.release()
+    if result_writer is not None:
+        result_writer.close()
+    if video_writer is not None:
+        video_writer.release()
+        print(f"✓ Annotated video saved to {save_video}")
+    print_throughput(frame_idx, wall_time)
+    sampler.report()
+    print("Video processing complete.")
+
+
+def recognize_video(video_path, headless=False, output=None, save_video=None, workers=1, segment_seconds=None,
+                    sample_fps=None, scene_threshold=None, detector=None, embedder=None, gallery=None,
+                    on_first_frame=None):
+    if headless and workers > 1:
+        return recognize_video_parallel(video_path, workers, segment_seconds or VIDEO_SEGMENT_SECONDS,
+                                        output, save_video, sample_fps, scene_threshold)
+    if headless:
+        return recognize_video_headless(video_path, output, save_video, sample_fps, scene_threshold,
+                                        detector, embedder, gallery)
+    if gallery is None:
+        gallery = load_gallery()
+    if gallery is None:
         return
     try:
-        embedder = FaceNet()
-        detector = MTCNN()
+        if embedder is None:
+            embedder = load_embedder()
+        if detector is None:
+            detector = MTCNN()
     except Exception as e:
         print(f"Error initializing models: {e}")
         return
@@ -22,62 +365,81 @@ def recognize_video(video_path):
     if not cap.isOpened():
         print(f"Error: Could not open video file: {video_path}")
         return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    result_writer = ResultWriter(output) if output else None
+    video_writer = open_video_writer(save_video, cap, fps) if save_video else None
     print(f"Processing video: {os.path.basename(video_path)}")
     print("Press 'q' to quit.")
     window_name = 'Video Face Recognition - Drag corners to resize (Press Q to quit)'
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
     cv2.resizeWindow(window_name, WINDOW_INITIAL_WIDTH, WINDOW_INITIAL_HEIGHT)
+    tracker = FaceTracker()
+    scheduler = DetectionScheduler()
+    frame_idx = 0
+    start_time = time.perf_counter()
     while True:
         ret, frame = cap.read()
         if not ret:
             print("End of video reached.")
             break
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        try:
-            results = detector.detect_faces(rgb_frame)
-            if results:
-                for result in results:
-                    x, y, w, h = result['box']
-                    x, y = abs(x), abs(y)
-                    face = rgb_frame[y:y+h, x:x+w]
-                    try:
-                        face = cv2.resize(face, (160, 160))
-                        face_pixels = np.expand_dims(face, axis=0)
-                        embedding = embedder.embeddings(face_pixels)[0]
-                        folder_name, _ = find_best_match(
-                            embedding, known_embeddings, known_folder_names, RECOGNITION_THRESHOLD
-                        )
-                        if folder_name is not None:
-                            if folder_name in person_info:
-                                display_name, age = person_info[folder_name]
-                            else:
-                                display_name = folder_name
-                                age = "N/A"
-                            color = (0, 0, 255)
-                            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                            cv2.putText(frame, display_name, (x, y-30), cv2.FONT_HERSHEY_TRIPLEX, 0.7, color, 2)
-                            cv2.putText(frame, f"Age: {age}", (x, y-10), cv2.FONT_HERSHEY_TRIPLEX, 0.5, color, 2)
-                        else:
-                            color = (0, 255, 0)
-                            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-                            cv2.putText(frame, "Unknown", (x, y-10), cv2.FONT_HERSHEY_TRIPLEX, 0.7, color, 2)
-                    except Exception:
-                        continue
-        except Exception:
-            pass
+        timestamp = frame_idx / fps
+        frame_start = time.perf_counter()
+        if scheduler.should_run(frame_idx):
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            try:
+                results = detect_faces(detector, rgb_frame)
+                scheduler.record('detect', (time.perf_counter() - frame_start) * 1000.0)
+                identify_tracks(rgb_frame, results, tracker, embedder, gallery, timestamp, scheduler=scheduler)
+            except Exception:
+                pass
+        faces = tracker.face_data(timestamp)
+        if result_writer is not None:
+            result_writer.write(frame_idx, timestamp, faces)
+        frame_idx += 1
+        render_start = time.perf_counter()
+        draw_faces(frame, faces)
+        if video_writer is not None:
+            video_writer.write(frame)
+        cv2.putText(frame, scheduler.status_text(), (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
         cv2.imshow(window_name, frame)
+        if on_first_frame is not None:
+            on_first_frame()
+            on_first_frame = None
+        scheduler.record('render', (time.perf_counter() - render_start) * 1000.0)
         if cv2.waitKey(30) & 0xFF == ord('q'):
             break
         if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
             break
+    wall_time = time.perf_counter() - start_time
     cap.release()
+    if result_writer is not None:
+        result_writer.close()
+    if video_writer is not None:
+        video_writer.release()
+        print(f"✓ Annotated video saved to {save_video}")
     cv2.destroyAllWindows()
+    print(tracker.summary())
+    print_embedder_summary(embedder)
+    print_throughput(frame_idx, wall_time)
     print("Video processing complete.")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python video_recognition.py <video_path>")
-        sys.exit(1)
-    video_path = sys.argv[1]
-    recognize_video(video_path)
+    parser = argparse.ArgumentParser(description="Recognize faces in a video file")
+    parser.add_argument('video_path')
+    parser.add_argument('--headless', action='store_true', help="No preview window; process frames as fast as possible")
+    parser.add_argument('--output', default=None, help="Write per-frame detections to a .jsonl or .csv file")
+    parser.add_argument('--save-video', default=None, help="Write an annotated copy of the video (mp4)")
+    parser.add_argument('--workers', type=int, default=VIDEO_WORKERS,
+                        help="Headless mode: split the video into segments processed by this many worker processes")
+    parser.add_argument('--segment-seconds', type=float, default=VIDEO_SEGMENT_SECONDS,
+                        help="Length of each video segment in parallel mode")
+    parser.add_argument('--sample-fps', type=float, default=VIDEO_SAMPLE_FPS,
+                        help="Headless mode: analyze this many frames per second of video; others are skipped undecoded")
+    parser.add_argument('--scene-threshold', type=float, default=SCENE_CHANGE_THRESHOLD,
+                        help="Headless mode: skip frames whose mean grey-level change from the last analyzed frame is below this")
+    args = parser.parse_args()
+    if not args.headless and (args.workers > 1 or args.sample_fps or args.scene_threshold):
+        print("Note: --workers, --sample-fps and --scene-threshold only apply with --headless.")
+    recognize_video(args.video_path, args.headless, args.output, args.save_video, args.workers, args.segment_seconds,
+                    args.sample_fps, args.scene_threshold)